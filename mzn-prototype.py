@@ -20,8 +20,12 @@ from checker import *
 import instance2dzn as i2dzn
 import forecast2dzn as f2dzn
 import checker_mzn as chkmzn
+import heuristic
+from solution_cache import SolutionCache
+import solver_select
 from prices_data import *
 from prices_regress import *
+from price_features import get_features
 import numpy as np
 # if you don't have sklearn installed, here is a tip from Lieven Paulissen for windows users: "I installed the python wheels using the pip command, especially numpy and matplotlib, from here: http://www.lfd.uci.edu/~gohlke/pythonlibs."
 from sklearn import linear_model
@@ -43,8 +47,10 @@ def qflatten(L):
 # dat: prediction data
 # args: optional dict of argument options
 def run(f_instances, day, dat, args=None):
-    tmpdir = ""
-    if args.tmp:
+    tmpdir = None
+    if args.inline_dzn or args.heuristic:
+        pass
+    elif args.tmp:
         tmpdir = args.tmp
         os.mkdir(args.tmp)
     else:
@@ -60,9 +66,11 @@ def run(f_instances, day, dat, args=None):
     preds = [] # [(model_name, predictions)]
 
     # features, learning and predictions
-    rows_prev = get_data_prevdays(dat, day, timedelta(args.historic_days))
-    X_train = [ [eval(v) for (k,v) in row.iteritems() if k in column_features] for row in rows_prev]
-    y_train = [ eval(row[column_predict]) for row in rows_prev ]
+    # (built once per data, leaderboard_run.py calls run() per start day)
+    feats = get_features(dat, column_features)
+    first = day - timedelta(args.historic_days)
+    X_train = feats.rows(first, day)
+    y_train = feats.target(column_predict, first, day)
 
     clf = linear_model.LinearRegression()
     clf.fit(X_train, y_train)
@@ -72,9 +80,8 @@ def run(f_instances, day, dat, args=None):
     days = []
     for (i,f) in enumerate(f_instances):
         today = day + timedelta(i)
-        rows_tod = get_data_day(dat, today)
-        X_test = [ [eval(v) for (k,v) in row.iteritems() if k in column_features] for row in rows_tod]
-        y_test = [ eval(row[column_predict]) for row in rows_tod ]
+        X_test = feats.rows(today, today + timedelta(1))
+        y_test = feats.target(column_predict, today, today + timedelta(1)).tolist()
         preds.append( clf.predict(X_test) )
         actuals.append( y_test )
         days.append( today )
@@ -84,18 +91,40 @@ def run(f_instances, day, dat, args=None):
         plot_preds( [('me',qflatten(preds))], qflatten(actuals) )
 
     # the scheduling
-    triples = [] # the results: [('load1/day01.txt', '2012-02-01', InstanceObject), ...]
-    for (i,f) in enumerate(f_instances):
-        data_forecasts = preds[i]
-        data_actual = actuals[i]
-        (timing, out) = runcheck.mzn_run(args.file_mzn, f, data_forecasts,
-                                tmpdir, mzn_dir=args.mzn_dir, mzn_solver=args.mzn_solver,
+    mzn_solver = args.mzn_solver
+    if ',' in mzn_solver: # portfolio
+        mzn_solver = mzn_solver.split(',')
+    select = None
+    if args.select:
+        selector = solver_select.Selector(solver_select.read_log(args.select))
+        select = lambda f, prices: selector.select(solver_select.instance_features(f, prices))
+    multires = None
+    if args.multires:
+        multires = (args.multires, args.multires_radius)
+    cache = None
+    if args.cache:
+        cache = SolutionCache(args.cache, max_bytes=int(args.cache_size*2**20))
+    if args.heuristic:
+        results = (heuristic.schedule_instance(f, preds[i],
+                                   data_actual=actuals[i],
+                                   verbose=args.v-1) + (None,)
+                   for (i,f) in enumerate(f_instances))
+    else:
+        results = runcheck.mzn_runall(args.file_mzn, f_instances, preds, tmpdir,
+                                actuals=actuals, jobs=(args.jobs or None),
+                                time_limit=args.time_limit, cache=cache,
+                                presolve=args.presolve, fast_path=args.fast_path,
+                                mzn_dir=args.mzn_dir, mzn_solver=mzn_solver,
                                 print_output=args.print_output,
-                                verbose=args.v-1)
-        instance = runcheck.mzn_toInstance(f, out, data_forecasts,
-                                  data_actual=data_actual,
-                                  pretty_print=args.print_pretty,
-                                  verbose=args.v-1)
+                                pretty_print=args.print_pretty,
+                                verbose=args.v-1, select=select,
+                                multires=multires)
+    triples = [] # the results: [('load1/day01.txt', '2012-02-01', InstanceObject), ...]
+    nr_skipped = 0
+    for (i,(timing,instance,stats)) in enumerate(results):
+        f = f_instances[i]
+        if args.heuristic and args.print_pretty and instance:
+            chkmzn.pretty_print(instance)
         triples.append( (f, str(days[i]), instance) )
         if args.v >= 1:
             # csv print:
@@ -104,28 +133,59 @@ def run(f_instances, day, dat, args=None):
                 print "scheduling_scenario; date; cost_forecast; cost_actual; runtime"
             today = day + timedelta(i)
             chkmzn.print_instance_csv(f, today.__str__(), instance, timing=timing, header=False)
+        if args.v >= 2 and stats:
+            print "%s; %s"%(f, runcheck.format_stats(stats))
+        if stats and stats['skipped']:
+            nr_skipped += 1
+        if stats and args.runtime_log:
+            runcheck.log_runs(args.runtime_log, f, preds[i], timing, stats)
+        if stats and 'winner' in stats and args.portfolio_log:
+            runcheck.log_portfolio(args.portfolio_log, f, stats)
+
+    if args.fast_path and args.v >= 1:
+        print "Solver skipped for %i of %i instances"%(nr_skipped, len(f_instances))
+    if args.portfolio_log and args.v >= 1:
+        print "Win rates in '%s':"%args.portfolio_log
+        runcheck.print_win_rates(runcheck.portfolio_win_rates(args.portfolio_log))
+    if cache and args.v >= 1:
+        print cache
+
+    if tmpdir and not args.tmp_keep:
+        shutil.rmtree(tmpdir)
 
     return triples
 
-    if not args.tmp_keep:
-        shutil.rmtree(tmpdir)
-
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(description="Run and check a MZN model in ICON challenge data")
     parser.add_argument("file_mzn")
     parser.add_argument("file_instance", help="(can also be a directory to run everything matching 'day*.txt' in the directory)")
-    parser.add_argument("--mzn-solver", help="the mzn solver to use (mzn-g12mip or mzn-gecode for example)", default='mzn-g12mip')
+    parser.add_argument("--mzn-solver", help="the mzn solver to use (mzn-g12mip or mzn-gecode for example), a comma separated list races the solvers as a portfolio", default='mzn-g12mip')
+    parser.add_argument("--runtime-log", help="file to append the runtime and instance features of every solver run to (for --select and scripts/solver_select.py)")
+    parser.add_argument("--select", help="runtime log to train on, picks the model and solver expected to be fastest per instance (overrides file_mzn and --mzn-solver)")
+    parser.add_argument("--portfolio-log", help="file to append the winner of every portfolio race to, the win rates per load in it are printed at the end")
     parser.add_argument("--mzn-dir", help="optionally, if the binaries are not on your PATH, set this to the directory of the MiniZinc IDE", default="")
     parser.add_argument("--tmp", help="temp directory (default = automatically generated)")
+    parser.add_argument("--presolve", help="add the feasible start times and machines of every task to the dzn (the model has to declare j_starts, j_mach and m_usable, see scripts/presolve.py)", action="store_true")
+    parser.add_argument("--multires", help="solve on a time grid this many times coarser first, then at full resolution around the coarse starts (implies the --presolve model declarations, see scripts/multires.py)", type=int)
+    parser.add_argument("--multires-radius", help="number of time periods a task may start from its coarse start (default = the --multires factor)", type=int)
+    parser.add_argument("--fast-path", help="skip the solver when every task at its own cheapest start fits on the machines (optimal for the task costs)", action="store_true")
+    parser.add_argument("--inline-dzn", help="pass the dzn data on the solver command line (-D) instead of through files in a temp directory", action="store_true")
+    parser.add_argument("-t", "--time-limit", help="stop the solver after this many seconds and keep its best solution so far", type=float)
+    parser.add_argument("--cache", help="directory of the solution cache, solves of the same model, instance, forecast and solver are not repeated (default = no cache)")
+    parser.add_argument("--cache-size", help="maximum size of the solution cache in MB", type=float, default=100)
+    parser.add_argument("-j", "--jobs", help="number of instances to solve in parallel (0 = number of cpus)", type=int, default=1)
     parser.add_argument("-d", "--day", help="Day to start from (in YYYY-MM-DD format)")
     parser.add_argument("-c", "--historic-days", help="How many historic days to learn from", default=30, type=int)
+    parser.add_argument("--heuristic", help="schedule with the native heuristic (scripts/heuristic.py) instead of MiniZinc, file_mzn is not used", action="store_true")
     # debugging options:
     parser.add_argument("-p", "--print-pretty", help="pretty print the machines and tasks", action="store_true")
     parser.add_argument("-v", help="verbosity (0,1,2 or 3)", type=int, default=1)
     parser.add_argument("--print-output", help="print the output of minizinc", action="store_true")
     parser.add_argument("--tmp-keep", help="keep created temp subdir", action="store_true")
     args = parser.parse_args()
+    if args.multires and ',' in args.mzn_solver:
+        parser.error("--multires does not combine with a portfolio of solvers")
     
     # if you want to hardcode the MiniZincIDE path for the binaries, here is a resonable place to do that
     #args.mzn_dir = "/home/tias/local/src/MiniZincIDE-2.0.13-bundle-linux-x86_64"
@@ -156,8 +216,18 @@ if __name__ == '__main__':
 
     # compute total actual cost (and time)
     tot_act = 0
-    for (f,day,instance) in triples:
+    nr_unsolved = 0
+    for (f,dayx,instance) in triples:
+        if instance is None:
+            print "Warning: no solution for '%s' (%s), left out of the total"%(f, dayx)
+            nr_unsolved += 1
+            continue
         instance.compute_costs()
         tot_act += instance.day.cj_act
 
-    print "%s from %s, linear: total actual cost: %.1f (runtime: %.2f)"%(args.file_instance, day, tot_act, runtime)
+    method = "linear"
+    if args.heuristic:
+        method = "linear+heuristic"
+    print "%s from %s, %s: total actual cost: %.1f (runtime: %.2f)"%(args.file_instance, day, method, tot_act, runtime)
+    if nr_unsolved:
+        print "Total over the %i of %i instances with a solution"%(len(triples)-nr_unsolved, len(triples))
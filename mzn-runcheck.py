@@ -11,6 +11,11 @@ import subprocess
 import tempfile
 import time
 import glob
+import itertools
+import signal
+import threading
+import Queue
+from multiprocessing.pool import ThreadPool
 
 
 cwd=os.path.dirname(os.path.realpath(__file__))
@@ -19,6 +24,12 @@ from checker import *
 import instance2dzn as i2dzn
 import forecast2dzn as f2dzn
 import checker_mzn as chkmzn
+import heuristic
+from solution_cache import SolutionCache
+import solver_select
+import instance_data
+import presolve as pres
+import multires
 
 def basename(fname):
     return os.path.splitext(os.path.basename(fname))[0]
@@ -46,26 +57,120 @@ def which(program):
 
     return None
 
-def mzn_run(file_mzn, file_instance, data_forecasts, tmpdir, mzn_solver='mzn-g12mip', mzn_dir=None, print_output=False, verbose=0, check_win_hack=True):
-    # ./instance2dzn.py ../smallinstances/demo_00/instance.txt
-    # TODO: maybe this should (have) use(d) Instance() from checker...
-    data = i2dzn.read_instance(file_instance)
-    i2dzn.make_offset1(data)
-    dzn_data = i2dzn.get_dzn(data)
-    dzn_instance = join(tmpdir, "%s.dzn"%basename(file_instance))
-    with open(dzn_instance, 'w') as fout:
-        fout.write(dzn_data)
-    if verbose >= 2:
-        print "Written dzn_instance to",dzn_instance
+def _readlines(stream, put):
+    for line in iter(stream.readline, ''):
+        put(line)
+    put(None)
+
+def _kill(p):
+    try:
+        if os.name == "nt":
+            p.kill()
+        else:
+            os.killpg(p.pid, signal.SIGKILL) # also mzn2fzn and the fzn solver
+    except OSError:
+        pass # already finished
+
+def mzn_exec(cmd, env, time_limit=None, on_solution=None, stop=None):
+    # runs the solver and reads its output as it arrives, calls
+    # on_solution(seconds since start, lines) for every solution as soon as
+    # its '----------' line is printed
+    # after time_limit seconds, or when the threading.Event 'stop' is set,
+    # the solver is killed and the output is cut after the last complete
+    # solution
+    # returns (timing, output lines, stderr, killed) with killed whether the
+    # solver was killed (time limit or stop) rather than finished by itself
+    time_start = time.time()
+    kwargs = dict()
+    if os.name != "nt":
+        kwargs['preexec_fn'] = os.setsid # own process group, see _kill()
+    p = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, env=env, **kwargs)
+    lines = Queue.Queue()
+    err = []
+    readers = [threading.Thread(target=_readlines, args=(p.stdout, lines.put)),
+               threading.Thread(target=_readlines, args=(p.stderr, err.append))]
+    for t in readers:
+        t.daemon = True
+        t.start()
+
+    out = []
+    complete = 0 # out[:complete] are complete solutions
+    killed = False
+    while True:
+        wait = None
+        if time_limit is not None:
+            wait = time_start + time_limit - time.time()
+        if (wait is not None and wait <= 0) or (stop and stop.is_set()):
+            _kill(p)
+            killed = True
+            out = out[:complete]
+            break
+        if stop:
+            wait = min(wait, 0.1) if wait is not None else 0.1
+        try:
+            line = lines.get(timeout=wait)
+        except Queue.Empty:
+            continue
+        if line is None:
+            break
+        out.append(line.rstrip('\n'))
+        if line.startswith('----------'):
+            if on_solution:
+                on_solution(time.time() - time_start, out[complete:])
+            complete = len(out)
+    p.wait()
+    timing = (time.time() - time_start)
+    for t in readers:
+        t.join()
+    return (timing, out, "".join(e for e in err if e), killed)
 
+def _replay(out, times, on_solution):
+    # on_solution() for the solutions of a cached run
+    complete = 0
+    for (i,line) in enumerate(out):
+        if line.startswith('----------'):
+            on_solution(times.pop(0), out[complete:i+1])
+            complete = i+1
+
+def mzn_run(file_mzn, file_instance, data_forecasts, tmpdir, mzn_solver='mzn-g12mip', mzn_dir=None, print_output=False, verbose=0, check_win_hack=True, time_limit=None, on_solution=None, cache=None, presolve=False, stop=None, windows=None):
+    # time_limit (seconds), on_solution and stop: see mzn_exec()
+    # returns (timing, output lines or None, killed), see mzn_exec()
+    # cache: optional SolutionCache, a hit returns the timing and output of
+    # the cached run without running the solver
+    # presolve: add the presolve sets to the dzn (the model must declare
+    # them, see scripts/presolve.py), the solver is not run when the presolve
+    # finds the instance infeasible
+    # windows: (first, last) start times per task (offset 0) to restrict the
+    # tasks to, passed through the presolve sets
+    # tmpdir: where to write the dzn files, or None to pass the data inline
+    # on the command line (-D) without any files
+    # ./instance2dzn.py ../smallinstances/demo_00/instance.txt
+    dzn_data = i2dzn.get_instance_dzn(file_instance)
+    if presolve or windows is not None:
+        pre = pres.presolve(instance_data.read_instance(file_instance), windows=windows)
+        if verbose >= 1 or pre['infeasible']:
+            print "%s: %s"%(file_instance, pres.format_stats(pre))
+        if pre['infeasible']:
+            print "Error: '%s' is infeasible, not running the solver"%file_instance
+            return (0.0, None, False)
+        dzn_data += pres.get_presolve_dzn(pre)
     # ./forecast2dzn.py -t 30 forecast.txt
     # starts from actual data
     dzn_data_forecasts = f2dzn.get_forecast_dzn(data_forecasts)
-    dzn_forecast = join(tmpdir, "forecast.dzn")
-    with open(dzn_forecast, 'w') as fout:
-        fout.write(dzn_data_forecasts)
-    if verbose >= 2:
-        print "Written dzn_forecast to:", dzn_forecast
+
+    key = None
+    if cache is not None:
+        with open(file_mzn, 'r') as fin:
+            key = cache.key(fin.read(), dzn_data, dzn_data_forecasts,
+                            mzn_solver, repr(time_limit))
+        hit = cache.get(key)
+        if hit:
+            (timing, out, times, killed) = hit
+            if verbose >= 1:
+                print "Cached result for '%s'"%file_instance
+            if on_solution:
+                _replay(out, times, on_solution)
+            return (timing, out, killed)
 
     # every more checks in case people don't set their path...
     env = os.environ.copy()
@@ -83,29 +188,53 @@ def mzn_run(file_mzn, file_instance, data_forecasts, tmpdir, mzn_solver='mzn-g12
         if not mzn_solver_bin.endswith('.bat'):
             mzn_solver_bin += '.bat'
 
-    # mzn-g12mip energy_noupdown.mzn ../smallinstances/demo_00/instance.dzn forecast.dzn > minizinc.out
-    cmd = [mzn_solver_bin, file_mzn, dzn_instance, dzn_forecast]
-    if verbose >= 1:
-        print "Running:", " ".join(cmd)
+    if tmpdir is None:
+        # mzn-g12mip energy_noupdown.mzn -D "time_step = 30; ... price = [...];"
+        cmd = [mzn_solver_bin, file_mzn, '-D', dzn_data + dzn_data_forecasts]
+        if verbose >= 1:
+            print "Running:", " ".join(cmd[:-1]), "<%i bytes of dzn data>"%len(cmd[-1])
+    else:
+        dzn_instance = join(tmpdir, "%s.dzn"%basename(file_instance))
+        with open(dzn_instance, 'w') as fout:
+            fout.write(dzn_data)
+        if verbose >= 2:
+            print "Written dzn_instance to",dzn_instance
+        dzn_forecast = join(tmpdir, "forecast.dzn")
+        with open(dzn_forecast, 'w') as fout:
+            fout.write(dzn_data_forecasts)
+        if verbose >= 2:
+            print "Written dzn_forecast to:", dzn_forecast
 
-    time_start = time.time()
-    p = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, env=env)
-    out, err = p.communicate()
-    timing = (time.time() - time_start)
+        # mzn-g12mip energy_noupdown.mzn ../smallinstances/demo_00/instance.dzn forecast.dzn > minizinc.out
+        cmd = [mzn_solver_bin, file_mzn, dzn_instance, dzn_forecast]
+        if verbose >= 1:
+            print "Running:", " ".join(cmd)
+
+    times = [] # of every solution, for the cache
+    def record(t, lines):
+        times.append(t)
+        if on_solution:
+            on_solution(t, lines)
+    (timing, out, err, killed) = mzn_exec(cmd, env, time_limit=time_limit,
+                                          on_solution=record, stop=stop)
+    if verbose >= 1 and killed and not (stop and stop.is_set()):
+        print "Stopped '%s' after the time limit of %gs"%(' '.join(cmd), time_limit)
 
     if print_output or verbose >= 1:
         print "Output: \"\"\""
-        print out
+        print "\n".join(out)
         print "\"\"\""
     if err != None and err.strip() != "":
         print "Error running '%s':"%(' '.join(cmd))
         print err
     else:
-        out = out.split('\n')
         #print "done, ",[x for x in out if x.startswith('Cost=')]
-        return (timing, out)
+        # not when stopped before any solution or by a portfolio race
+        if cache is not None and times and not (stop and stop.is_set()):
+            cache.put(key, timing, out, times, killed)
+        return (timing, out, killed)
 
-    return (timing, None)
+    return (timing, None, killed)
 
 def mzn_toInstance(file_instance, out, data_forecasts, data_actual=None, pretty_print=False, verbose=0):
         # ./checker_mzn.py ../smallinstances/demo_01
@@ -114,10 +243,14 @@ def mzn_toInstance(file_instance, out, data_forecasts, data_actual=None, pretty_
         # read standard instance and load forecast
         instance.read_instance(file_instance)
         instance.load_forecast(data_forecasts)
-        if data_actual:
+        if data_actual is not None:
             instance.load_actual(data_actual)
         # load minizinc solution from 'out'
-        chkmzn.read_mznsolution(instance, out)
+        try:
+            chkmzn.read_mznsolution(instance, out)
+        except chkmzn.MznSolutionError as e:
+            print "Error: %s"%e
+            return None
 
         if pretty_print or verbose >= 1:
             chkmzn.pretty_print(instance)
@@ -132,14 +265,371 @@ def mzn_toInstance(file_instance, out, data_forecasts, data_actual=None, pretty_
 
         return None
 
+def _fast_path(file_instance, data_forecasts, data_actual, stats, pretty_print=False, verbose=0):
+    # see mzn_solve(), returns (timing, instance, stats) or None
+    time_start = time.time()
+    data = instance_data.read_instance(file_instance)
+    sched = heuristic.independent_optimum(data, data_forecasts)
+    if sched is not None:
+        instance = heuristic.schedule_to_instance(file_instance, data, sched,
+                                                  data_forecasts,
+                                                  data_actual=data_actual)
+        timing = (time.time() - time_start)
+        if instance:
+            if verbose >= 1:
+                print "Independent optimum fits for '%s', solver skipped"%file_instance
+            if pretty_print or verbose >= 1:
+                chkmzn.pretty_print(instance)
+            stats.update(nr_solutions=1, time_first=timing,
+                         time_best=timing, skipped=True, complete=True)
+            return (timing, instance, stats)
+    return None
+
+def mzn_solve(file_mzn, file_instance, data_forecasts, tmpdir, data_actual=None, time_limit=None, cache=None, presolve=False, fast_path=False, mzn_solver='mzn-g12mip', mzn_dir=None, print_output=False, pretty_print=False, verbose=0, stop=None, windows=None):
+    # mzn_run() that verifies every intermediate solution as it arrives and
+    # keeps the verified one with the lowest forecast cost, so a time limit
+    # still gives the best solution found so far
+    # returns (timing, instance or None, stats) with stats the number of
+    # solutions, the time to the first and to the best one and whether the
+    # solver was stopped by the time limit or skipped, and whether it
+    # completed its search (the best solution is optimal)
+    # fast_path: when every task at its own cheapest start fits on the
+    # machines that schedule is optimal for the task costs, and the solver
+    # is skipped (heuristic.independent_optimum())
+    best = dict(instance=None, cost=None)
+    stats = dict(nr_solutions=0, time_first=None, time_best=None,
+                 timeout=False, skipped=False, complete=False,
+                 model=file_mzn, solver=mzn_solver)
+
+    if fast_path:
+        res = _fast_path(file_instance, data_forecasts, data_actual, stats,
+                         pretty_print=pretty_print, verbose=verbose)
+        if res:
+            return res
+
+    def on_solution(t, lines):
+        stats['nr_solutions'] += 1
+        if stats['time_first'] is None:
+            stats['time_first'] = t
+        instance = mzn_toInstance(file_instance, lines, data_forecasts,
+                                  data_actual=data_actual,
+                                  verbose=verbose-1)
+        if instance:
+            instance.compute_costs()
+            if best['instance'] is None or instance.day.cj_fore < best['cost']:
+                best['instance'] = instance
+                best['cost'] = instance.day.cj_fore
+                stats['time_best'] = t
+
+    (timing, out, killed) = mzn_run(file_mzn, file_instance, data_forecasts,
+                                    tmpdir, mzn_dir=mzn_dir,
+                                    mzn_solver=mzn_solver,
+                                    print_output=print_output, verbose=verbose,
+                                    time_limit=time_limit,
+                                    on_solution=on_solution, cache=cache,
+                                    presolve=presolve, stop=stop,
+                                    windows=windows)
+    # killed by the time limit, not by a won portfolio race
+    stats['timeout'] = killed and not (stop and stop.is_set())
+    stats['complete'] = bool(out) and not stats['timeout'] and \
+        any(line.startswith('==========') for line in out)
+    if stop and stop.is_set():
+        pass # lost a portfolio race
+    elif best['instance'] is None:
+        print "Error: no verified solution for '%s'"%file_instance
+    elif pretty_print or verbose >= 1:
+        chkmzn.pretty_print(best['instance'])
+    return (timing, best['instance'], stats)
+
+def mzn_portfolio(file_mzn, file_instance, data_forecasts, tmpdir, solvers, data_actual=None, time_limit=None, cache=None, presolve=False, fast_path=False, mzn_dir=None, print_output=False, pretty_print=False, verbose=0):
+    # races mzn_solve() with every solver in 'solvers' on the instance: the
+    # first one that completes its search (optimal) wins and the others are
+    # killed; at the time limit the solver with the best solution wins
+    # returns (timing, instance, stats) as mzn_solve(), stats of the winner
+    # with stats['winner'] its name ('' when none has a solution) and
+    # stats['race'] the {solver: (timing, complete)} of all solvers
+    stats = dict(nr_solutions=0, time_first=None, time_best=None,
+                 timeout=False, skipped=False, complete=False,
+                 model=file_mzn, solver='')
+    if fast_path:
+        res = _fast_path(file_instance, data_forecasts, data_actual, stats,
+                         pretty_print=pretty_print, verbose=verbose)
+        if res:
+            res[2]['winner'] = ''
+            res[2]['race'] = dict()
+            return res
+
+    stop = threading.Event()
+    results = dict() # solver -> (timing, instance, stats)
+    errors = dict() # solver -> sys.exc_info() of a race that raised
+    lock = threading.Lock()
+    def race(i, solver):
+        try:
+            subdir = None
+            if tmpdir is not None:
+                # solvers can be paths, e.g. /opt/minizinc/bin/fzn-gecode
+                subdir = join(tmpdir, "%02i_%s"%(i, basename(solver)))
+                os.mkdir(subdir)
+            res = mzn_solve(file_mzn, file_instance, data_forecasts, subdir,
+                            data_actual=data_actual, time_limit=time_limit,
+                            cache=cache, presolve=presolve,
+                            mzn_solver=solver, mzn_dir=mzn_dir,
+                            print_output=print_output, verbose=verbose,
+                            stop=stop)
+        except (SystemExit, Exception): # re-raised in the main thread
+            with lock:
+                errors[solver] = sys.exc_info()
+                stop.set() # the others would be thrown away
+            return
+        with lock:
+            if res[2]['complete'] and not stop.is_set():
+                results['winner'] = solver
+                stop.set()
+            results[solver] = res
+
+    threads = [threading.Thread(target=race, args=(i, solver)) for (i, solver) in enumerate(solvers)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    for solver in solvers:
+        if solver in errors:
+            (etype, value, tb) = errors[solver]
+            raise etype, value, tb
+
+    winner = results.get('winner')
+    if winner is None: # none completed, the best verified solution
+        found = [(results[solver][1].day.cj_fore, solver)
+                 for solver in solvers if results[solver][1]]
+        if found:
+            winner = min(found)[1]
+    if winner is None:
+        print "Error: no verified solution for '%s'"%file_instance
+        (timing, instance) = (max(results[solver][0] for solver in solvers), None)
+    else:
+        (timing, instance, stats) = results[winner]
+        if pretty_print or verbose >= 1:
+            chkmzn.pretty_print(instance)
+    stats['winner'] = winner or ''
+    stats['race'] = dict((solver, (results[solver][0], results[solver][2]['complete']))
+                         for solver in solvers)
+    if verbose >= 1:
+        print "Portfolio winner for '%s': %s"%(file_instance, stats['winner'])
+    return (timing, instance, stats)
+
+def mzn_multires(file_mzn, file_instance, data_forecasts, tmpdir, factor, radius=None, data_actual=None, time_limit=None, cache=None, fast_path=False, mzn_solver='mzn-g12mip', mzn_dir=None, print_output=False, pretty_print=False, verbose=0):
+    # mzn_solve() on the instance coarsened by 'factor' (time_step*factor,
+    # prices summed as forecast2dzn.rescale()), then on the full instance
+    # with every task's start within 'radius' fine periods (default: factor)
+    # of its coarse start, see scripts/multires.py
+    # the restriction goes through the presolve sets, so the model has to
+    # declare j_starts, j_mach and m_usable; without a coarse solution the
+    # full instance is solved unrestricted
+    # returns (timing, instance, stats) as mzn_solve(), timing of both
+    # solves and stats with the coarse_time, coarse_cost (forecast, at the
+    # coarse step), fine_time and whether the fine solve was restricted
+    if radius is None:
+        radius = factor
+    time_start = time.time()
+    data = instance_data.read_instance(file_instance)
+    if fast_path:
+        stats = dict(nr_solutions=0, time_first=None, time_best=None,
+                     timeout=False, skipped=False, complete=False,
+                     model=file_mzn, solver=mzn_solver)
+        res = _fast_path(file_instance, data_forecasts, data_actual, stats,
+                         pretty_print=pretty_print, verbose=verbose)
+        if res:
+            res[2].update(coarse_time=0.0, coarse_cost=None,
+                          fine_time=res[0], refined=False)
+            return res
+
+    coarse = multires.coarsen(data, factor)
+    if tmpdir is not None:
+        f_coarse = join(tmpdir, "coarse_%s.txt"%basename(file_instance))
+    else:
+        (fd, f_coarse) = tempfile.mkstemp(prefix="coarse_", suffix=".txt")
+        os.close(fd)
+    try:
+        multires.write_instance(coarse, f_coarse)
+        coarse_forecasts = f2dzn.rescale(coarse['time_step'], data_forecasts)
+        (c_timing, c_instance, c_stats) = \
+            mzn_solve(file_mzn, f_coarse, coarse_forecasts, tmpdir,
+                      time_limit=time_limit, cache=cache, presolve=True,
+                      mzn_solver=mzn_solver, mzn_dir=mzn_dir,
+                      print_output=print_output, verbose=verbose)
+    finally:
+        if tmpdir is None:
+            os.remove(f_coarse)
+
+    windows = None
+    coarse_cost = None
+    if c_instance:
+        coarse_cost = c_instance.day.cj_fore
+        windows = multires.neighbourhood(data, c_instance.day.assignment[:,1],
+                                         factor, radius)
+        if verbose >= 1:
+            print "Coarse solution for '%s' (factor %i): cost_forecast %.4f in %.2fs, refining within %i periods"%(file_instance, factor, coarse_cost, c_timing, radius)
+    else:
+        print "Warning: no coarse solution for '%s', solving it at full resolution"%file_instance
+
+    (timing, instance, stats) = \
+        mzn_solve(file_mzn, file_instance, data_forecasts, tmpdir,
+                  data_actual=data_actual, time_limit=time_limit,
+                  cache=cache, presolve=True, mzn_solver=mzn_solver,
+                  mzn_dir=mzn_dir, print_output=print_output,
+                  pretty_print=pretty_print, verbose=verbose,
+                  windows=windows)
+    stats.update(coarse_time=c_timing, coarse_cost=coarse_cost,
+                 fine_time=timing, refined=windows is not None)
+    return (time.time() - time_start, instance, stats)
+
+def log_portfolio(logfile, file_instance, stats):
+    # appends 'load; instance; winner; complete; time_best' to the log
+    with open(logfile, 'a') as fout:
+        f = os.path.abspath(file_instance)
+        time_best = "-"
+        if stats['time_best'] is not None:
+            time_best = "%.2f"%stats['time_best']
+        print >> fout, "%s; %s; %s; %s; %s"%(os.path.basename(os.path.dirname(f)), os.path.basename(f), stats['winner'], stats['complete'], time_best)
+
+def portfolio_win_rates(logfile):
+    # {load: {solver: (wins, races)}} from a log of log_portfolio()
+    wins = dict()
+    with open(logfile, 'r') as fin:
+        for line in fin:
+            fields = [x.strip() for x in line.split(';')]
+            if len(fields) < 3:
+                continue
+            (load, winner) = (fields[0], fields[2])
+            if winner:
+                wins.setdefault(load, dict())
+                wins[load][winner] = wins[load].get(winner, 0) + 1
+    rates = dict()
+    for (load, counts) in wins.iteritems():
+        total = sum(counts.values())
+        rates[load] = dict((solver, (n, total)) for (solver, n) in counts.iteritems())
+    return rates
+
+def print_win_rates(rates):
+    for load in sorted(rates):
+        print "%s: %s"%(load, ", ".join("%s %i/%i (%.0f%%)"%(solver, n, total, 100.0*n/total) for (solver, (n, total)) in sorted(rates[load].iteritems())))
+
+def log_runs(logfile, file_instance, data_forecasts, timing, stats):
+    # every solver run behind (timing, stats) to a solver_select runtime log
+    if stats['skipped']:
+        return
+    runs = [(stats['solver'], (timing, stats['complete']))]
+    if 'race' in stats:
+        runs = sorted(stats['race'].iteritems())
+    feats = solver_select.instance_features(file_instance, data_forecasts)
+    for (solver, (timing, complete)) in runs:
+        if timing is not None:
+            solver_select.log_run(logfile, file_instance, stats['model'],
+                                  solver, timing, complete, feats)
+
+def format_stats(stats):
+    def fmt(t):
+        if t is None:
+            return "-"
+        return "%.2f"%t
+    msg = "solutions %i; time_first %s; time_best %s; timeout %s; skipped %s"%(stats['nr_solutions'], fmt(stats['time_first']), fmt(stats['time_best']), stats['timeout'], stats['skipped'])
+    if 'coarse_time' in stats:
+        msg += "; coarse_time %s; fine_time %s; refined %s"%(fmt(stats['coarse_time']), fmt(stats['fine_time']), stats['refined'])
+    return msg
+
+def mzn_runall(file_mzn, f_instances, forecasts, tmpdir, actuals=None, jobs=1, time_limit=None, cache=None, presolve=False, fast_path=False, mzn_solver='mzn-g12mip', mzn_dir=None, print_output=False, pretty_print=False, verbose=0, select=None, multires=None):
+    # mzn_solve() for every instance, 'jobs' at a time, or mzn_portfolio()
+    # when mzn_solver is a list of solvers
+    # multires: optional (factor, radius), mzn_multires() with one solver
+    # select: optional function(instance file, forecast) -> (model, solver)
+    # that overrides file_mzn and mzn_solver per instance
+    # forecasts (and actuals): one list of prices per instance
+    # every instance gets its own subdirectory of tmpdir for its dzn files
+    # (tmpdir None: no files, see mzn_run())
+    # yields (timing, instance, stats) in the order of f_instances, as they
+    # finish
+    # (threads suffice: the workers mostly wait on the solver process)
+    if actuals is None:
+        actuals = [None]*len(f_instances)
+
+    def solve(i):
+        f = f_instances[i]
+        (model, solver) = (file_mzn, mzn_solver)
+        try:
+            if select:
+                (model, solver) = select(f, forecasts[i])
+            subdir = None
+            if tmpdir is not None:
+                subdir = join(tmpdir, "%02i_%s"%(i, basename(f)))
+                os.mkdir(subdir)
+            if isinstance(solver, (list, tuple)):
+                return mzn_portfolio(model, f, forecasts[i], subdir,
+                                     solver, data_actual=actuals[i],
+                                     time_limit=time_limit, cache=cache,
+                                     presolve=presolve, fast_path=fast_path,
+                                     mzn_dir=mzn_dir,
+                                     print_output=print_output,
+                                     pretty_print=pretty_print,
+                                     verbose=verbose) + (None,)
+            if multires:
+                return mzn_multires(model, f, forecasts[i], subdir,
+                                    multires[0], radius=multires[1],
+                                    data_actual=actuals[i],
+                                    time_limit=time_limit, cache=cache,
+                                    fast_path=fast_path,
+                                    mzn_dir=mzn_dir, mzn_solver=solver,
+                                    print_output=print_output,
+                                    pretty_print=pretty_print,
+                                    verbose=verbose) + (None,)
+            return mzn_solve(model, f, forecasts[i], subdir,
+                             data_actual=actuals[i], time_limit=time_limit,
+                             cache=cache, presolve=presolve,
+                             fast_path=fast_path,
+                             mzn_dir=mzn_dir, mzn_solver=solver,
+                             print_output=print_output,
+                             pretty_print=pretty_print,
+                             verbose=verbose) + (None,)
+        except SystemExit as e: # missing binaries, exit from main
+            return (None, None, None, e)
+
+    pool = None
+    results = itertools.imap(solve, range(len(f_instances)))
+    if jobs != 1:
+        pool = ThreadPool(jobs)
+        results = pool.imap(solve, range(len(f_instances)))
+    try:
+        for (timing, instance, stats, err) in results:
+            if err:
+                raise err
+            yield (timing, instance, stats)
+    finally:
+        if pool:
+            pool.terminate()
+            pool.join()
+
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(description="Run and check a MZN model in ICON challenge data")
     parser.add_argument("file_mzn")
     parser.add_argument("file_instance", help="(can also be a directory to run everything matching 'day*.txt' in the directory)")
     parser.add_argument("file_forecast")
-    parser.add_argument("--mzn-solver", help="the mzn solver to use (mzn-g12mip or mzn-gecode for example)", default='mzn-g12mip')
+    parser.add_argument("--mzn-solver", help="the mzn solver to use (mzn-g12mip or mzn-gecode for example), a comma separated list races the solvers as a portfolio", default='mzn-g12mip')
+    parser.add_argument("--runtime-log", help="file to append the runtime and instance features of every solver run to (for --select and scripts/solver_select.py)")
+    parser.add_argument("--select", help="runtime log to train on, picks the model and solver expected to be fastest per instance (overrides file_mzn and --mzn-solver)")
+    parser.add_argument("--portfolio-log", help="file to append the winner of every portfolio race to, the win rates per load in it are printed at the end")
     parser.add_argument("--mzn-dir", help="optionally, if the binaries are not on your PATH, set this to the directory of the MiniZinc IDE", default="")
     parser.add_argument("--tmp", help="temp directory (default = automatically generated)")
+    parser.add_argument("--presolve", help="add the feasible start times and machines of every task to the dzn (the model has to declare j_starts, j_mach and m_usable, see scripts/presolve.py)", action="store_true")
+    parser.add_argument("--multires", help="solve on a time grid this many times coarser first, then at full resolution around the coarse starts (implies the --presolve model declarations, see scripts/multires.py)", type=int)
+    parser.add_argument("--multires-radius", help="number of time periods a task may start from its coarse start (default = the --multires factor)", type=int)
+    parser.add_argument("--compare-full", help="with --multires, also solve every instance at full resolution and report the cost and runtime trade-off", action="store_true")
+    parser.add_argument("--fast-path", help="skip the solver when every task at its own cheapest start fits on the machines (optimal for the task costs)", action="store_true")
+    parser.add_argument("--inline-dzn", help="pass the dzn data on the solver command line (-D) instead of through files in a temp directory", action="store_true")
+    parser.add_argument("-t", "--time-limit", help="stop the solver after this many seconds and keep its best solution so far", type=float)
+    parser.add_argument("--cache", help="directory of the solution cache, solves of the same model, instance, forecast and solver are not repeated (default = no cache)")
+    parser.add_argument("--cache-size", help="maximum size of the solution cache in MB", type=float, default=100)
+    parser.add_argument("-j", "--jobs", help="number of instances to solve in parallel (0 = number of cpus)", type=int, default=1)
+    parser.add_argument("--heuristic", help="schedule with the native heuristic (scripts/heuristic.py) instead of MiniZinc", action="store_true")
+    parser.add_argument("--compare-heuristic", help="also run the native heuristic and report its cost and runtime against MiniZinc", action="store_true")
     # debugging options:
     parser.add_argument("-p", "--print-pretty", help="pretty print the machines and tasks", action="store_true")
     parser.add_argument("-v", help="verbosity (0,1 or 2)", type=int, default=0)
@@ -150,8 +640,10 @@ if __name__ == '__main__':
     # if you want to hardcode the MiniZincIDE path for the binaries, here is a resonable place to do that
     #args.mzn_dir = "/home/tias/local/src/MiniZincIDE-2.0.13-bundle-linux-x86_64"
 
-    tmpdir = ""
-    if args.tmp:
+    tmpdir = None
+    if args.inline_dzn:
+        pass
+    elif args.tmp:
         tmpdir = args.tmp
         os.mkdir(args.tmp)
     else:
@@ -168,18 +660,100 @@ if __name__ == '__main__':
     timestep = i2dzn.read_instance(f_instances[0])['time_step']
     data_forecasts = f2dzn.rescale(timestep, data_forecasts)
 
+    cache = None
+    if args.cache:
+        cache = SolutionCache(args.cache, max_bytes=int(args.cache_size*2**20))
+
+    mzn_solver = args.mzn_solver
+    if ',' in mzn_solver:
+        mzn_solver = mzn_solver.split(',')
+
+    multires_opt = None
+    if args.multires:
+        if isinstance(mzn_solver, list):
+            parser.error("--multires does not combine with a portfolio of solvers")
+        multires_opt = (args.multires, args.multires_radius)
+
+    select = None
+    if args.select:
+        selector = solver_select.Selector(solver_select.read_log(args.select))
+        def select(f, prices):
+            algo = selector.select(solver_select.instance_features(f, prices))
+            if args.v >= 1:
+                print "Selected for '%s': %s %s"%((f,)+algo)
+            return algo
+
     # the actual stuff
-    for (i,f) in enumerate(f_instances):
-        (timing, out) = mzn_run(args.file_mzn, f, data_forecasts,
-                                tmpdir, mzn_dir=args.mzn_dir,
-                                mzn_solver=args.mzn_solver,
-                                print_output=args.print_output,
-                                verbose=args.v)
-        instance = mzn_toInstance(f, out, data_forecasts,
-                                  pretty_print=args.print_pretty,
-                                  verbose=args.v)
+    if args.heuristic:
+        results = (heuristic.schedule_instance(f, data_forecasts, verbose=args.v) + (None,)
+                   for f in f_instances)
+    else:
+        results = mzn_runall(args.file_mzn, f_instances,
+                             [data_forecasts]*len(f_instances), tmpdir,
+                             jobs=(args.jobs or None),
+                             time_limit=args.time_limit,
+                             cache=cache, presolve=args.presolve,
+                             fast_path=args.fast_path,
+                             mzn_dir=args.mzn_dir,
+                             mzn_solver=mzn_solver,
+                             print_output=args.print_output,
+                             pretty_print=args.print_pretty,
+                             verbose=args.v, select=select,
+                             multires=multires_opt)
+    nr_skipped = 0
+    tradeoff = [] # (multires time, full time, multires cost, full cost)
+    wins = dict() # portfolio winner -> count
+    for (i,(f,(timing,instance,stats))) in enumerate(itertools.izip(f_instances, results)):
+        if args.heuristic and args.print_pretty and instance:
+            chkmzn.pretty_print(instance)
         # csv print:
         chkmzn.print_instance_csv(f, args.file_forecast, instance, timing=timing, header=(i==0))
+        if stats and (args.time_limit or args.fast_path or args.multires or args.v >= 1):
+            print "%s; %s"%(f, format_stats(stats))
+        if stats and stats['skipped']:
+            nr_skipped += 1
+        if stats and args.runtime_log:
+            log_runs(args.runtime_log, f, data_forecasts, timing, stats)
+        if stats and 'winner' in stats:
+            wins[stats['winner']] = wins.get(stats['winner'], 0) + 1
+            if args.portfolio_log:
+                log_portfolio(args.portfolio_log, f, stats)
+
+        if args.multires and args.compare_full and not args.heuristic:
+            # same (selected) model and solver as the multires run, own dzn dir
+            f_subdir = None
+            if tmpdir is not None:
+                f_subdir = join(tmpdir, "%02i_%s_full"%(i, basename(f)))
+                os.mkdir(f_subdir)
+            (f_timing, f_instance, f_stats) = \
+                mzn_solve(stats['model'], f, data_forecasts, f_subdir,
+                          time_limit=args.time_limit, cache=cache,
+                          presolve=args.presolve, mzn_dir=args.mzn_dir,
+                          mzn_solver=stats['solver'], verbose=args.v)
+            if instance and f_instance:
+                (cost, f_cost) = (instance.day.cj_fore, f_instance.day.cj_fore)
+                tradeoff.append((timing, f_timing, cost, f_cost))
+                print "%s; multires: cost_forecast %.4f (%+.2f%% vs full %.4f); time %.2f (full %.2f)"%(f, cost, 100.0*(cost-f_cost)/f_cost, f_cost, timing, f_timing)
+
+        if args.compare_heuristic and not args.heuristic:
+            (h_timing, h_instance) = heuristic.schedule_instance(f, data_forecasts)
+            if instance and h_instance:
+                h_instance.compute_costs()
+                (cost, h_cost) = (instance.day.cj_fore, h_instance.day.cj_fore)
+                print "%s; heuristic: cost_forecast %.4f (%+.2f%% vs mzn %.4f); time %.3f (mzn %.2f)"%(f, h_cost, 100.0*(h_cost-cost)/cost, cost, h_timing, timing)
+
+    if args.fast_path:
+        print "Solver skipped for %i of %i instances"%(nr_skipped, len(f_instances))
+    if tradeoff:
+        (m_time, f_time, m_cost, f_cost) = map(sum, zip(*tradeoff))
+        print "Multires (factor %i) vs full resolution on %i of %i instances: time %.2f vs %.2f (speedup %.2fx), cost_forecast %.4f vs %.4f (%+.2f%%)"%(args.multires, len(tradeoff), len(f_instances), m_time, f_time, f_time/max(m_time, 1e-9), m_cost, f_cost, 100.0*(m_cost-f_cost)/f_cost)
+    if wins:
+        print "Portfolio wins: %s"%(", ".join("%s %i"%(solver or '(skipped/none)', n) for (solver, n) in sorted(wins.iteritems())))
+        if args.portfolio_log:
+            print "Win rates in '%s':"%args.portfolio_log
+            print_win_rates(portfolio_win_rates(args.portfolio_log))
+    if cache and args.v >= 1:
+        print cache
 
-    if not args.tmp_keep:
+    if tmpdir and not args.tmp_keep:
         shutil.rmtree(tmpdir)
@@ -24,9 +24,9 @@
 
 import sys
 from os.path import join, isfile
-from copy import deepcopy
-import logging
-import cStringIO
+from collections import namedtuple
+import numpy as np
+import instance_data
 
 
 datafolder = "data"
@@ -39,7 +39,7 @@ MINUTESINDAY = 24 * 60
 
 class Instance(object):
 
-    def __init__(self):
+    def __init__(self, failfast=False):
         self.instanceread = False
         self.actualsread = False
         self.forecastread = False
@@ -47,15 +47,9 @@ class Instance(object):
         self.machines = []
         self.day = self.q = self.nrresources = None
 
-        # Set up error logging to string buffer 'self.errstream'
-        self.log = logging.getLogger()
-        self.log.setLevel(logging.ERROR)
-        for handler in self.log.handlers:  # Remove other handlers
-            self.log.removeHandler(handler)
-        self.errstream = cStringIO.StringIO()
-        handler = logging.StreamHandler(self.errstream)
-        handler.setFormatter(logging.Formatter('%(levelname)s: %(message)s'))
-        self.log.addHandler(handler)
+        # Errors and constraint violations found in this instance. With
+        # failfast, verify() stops at the first violation.
+        self.violations = Violations(failfast)
 
     def read_instancefolder(self, folder,
                             actual=True,
@@ -75,47 +69,46 @@ class Instance(object):
             self.read_solution(solutionfname)
 
     def read_instance(self, filename):
-        with open(filename, "rt") as f:
-            self.q = int(f.readline())  # Time resolution
-            self.nrresources = int(f.readline())
-
-            nrmachines = int(f.readline())
-            for m in xrange(nrmachines):
-                machine = Machine(self.q, self.nrresources)
-                machine.read_instance(f)
-                self.machines.append(machine)
-
-            self.day = Day(self.machines, self.q, self.nrresources)
-            self.day.read_instance(f)
+        # Parsed once per process and shared by all instances of the file
+        data = instance_data.read_instance(filename)
+        self.q = data['time_step']  # Time resolution
+        self.nrresources = data['nr_res']
+
+        machinedata = MachineArrays.from_data(data['machines'])
+        taskdata = TaskArrays.from_data(data['tasks'],
+                                        MINUTESINDAY / self.q)
+        self.day = Day(machinedata, self.q, self.nrresources, taskdata,
+                       violations=self.violations)
+        self.machines = self.day.machines
         self.instanceread = True
 
     def read_actual(self, filename):
         with open(filename, "rt") as f:
             nrperiods = int(f.readline())
-            errlog(MINUTESINDAY / self.q == nrperiods,
+            errlog(self.violations, MINUTESINDAY / self.q == nrperiods,
                    "Actuals file contains a different number of "
-                   "time periods, expected %d, got %d." %
-                   (MINUTESINDAY / self.q, nrperiods))
+                   "time periods, expected %d, got %d.",
+                   MINUTESINDAY / self.q, nrperiods)
 
             self.day.read_actual(f, nrperiods)
         self.actualsread = True
 
     def load_actual(self, arr):
         nrperiods = len(arr)
-        errlog(MINUTESINDAY / self.q == nrperiods,
-                   "Actuals contain a different number of "
-                   "time periods, expected %d, got %d." %
-                   (MINUTESINDAY / self.q, nrperiods))
+        errlog(self.violations, MINUTESINDAY / self.q == nrperiods,
+               "Actuals contain a different number of "
+               "time periods, expected %d, got %d.",
+               MINUTESINDAY / self.q, nrperiods)
 
         self.day.actuals = arr
         self.actualsread = True
 
     def load_forecast(self, arr):
         nrperiods = len(arr)
-        errlog(MINUTESINDAY / self.q == nrperiods,
-                   "Forecasts contain a different number of "
-                   "time periods, expected %d, got %d." %
-                   (MINUTESINDAY / self.q, nrperiods))
+        errlog(self.violations, MINUTESINDAY / self.q == nrperiods,
+               "Forecasts contain a different number of "
+               "time periods, expected %d, got %d.",
+               MINUTESINDAY / self.q, nrperiods)
 
         self.day.forecast = arr
         self.forecastread = True
@@ -123,10 +116,10 @@ class Instance(object):
     def read_forecast(self, filename):
         with open(filename, "rt") as f:
             nrperiods = int(f.readline())
-            errlog(MINUTESINDAY / self.q == nrperiods,
+            errlog(self.violations, MINUTESINDAY / self.q == nrperiods,
                    "Forecast file contains a different number of "
-                   "time periods, expected %d, got %d." %
-                   (MINUTESINDAY / self.q, nrperiods))
+                   "time periods, expected %d, got %d.",
+                   MINUTESINDAY / self.q, nrperiods)
 
             self.day.read_forecast(f, nrperiods)
         self.forecastread = True
@@ -148,15 +141,32 @@ class Instance(object):
         assert self.solutionread, \
             "Please read in the solution before verifying."
 
-        self.day.verify()
-        return bool(self.geterrorstring())
+        try:
+            self.day.verify()
+        except FailFast:
+            pass
+        return bool(self.violations)
 
     def compute_costs(self):
         actual, forecast = self.day.compute_costs()
         return actual, forecast
 
+    def compute_scenario_costs(self, prices):
+        """
+            Cost of the schedule under many price scenarios at once.
+
+            prices: (scenarios x periods) matrix, one price vector per row.
+            Returns a dict with keys 'task', 'idle', 'up', 'down' and 'total',
+            each an array with one cost per scenario.
+        """
+        assert self.instanceread, \
+            "Please read in the instance before computing costs."
+        assert self.solutionread, \
+            "Please read in the solution before computing costs."
+        return self.day.compute_scenario_costs(prices)
+
     def geterrorstring(self):
-        return self.errstream.getvalue()
+        return self.violations.getstring()
 
     def __str__(self):
         return "<Instance q:%d nrresources:%d>" % \
@@ -165,32 +175,54 @@ class Instance(object):
 
 class Day(object):
 
-    def __init__(self, machines, q, nrresources):
-        # Take a deepcopy of the machines so we can parse their on/off data.
-        self.machines = deepcopy(machines)
+    def __init__(self, machinedata, q, nrresources, taskdata=None,
+                 violations=None):
+        # The instance data is shared and read-only, the Day only owns the
+        # (cheap) solution state: machine events and task assignments.
+        self.machinedata = machinedata
         self.q = q
         self.nrperiods = MINUTESINDAY / q
         self.nrresources = nrresources
-        self.tasks = []
+        if violations is None:
+            violations = Violations()
+        self.violations = violations
+        self.machines = [Machine(self, i) for i in xrange(len(machinedata))]
+        self.events = [None] * len(machinedata)
+        if taskdata is None:
+            taskdata = TaskArrays.empty(nrresources)
+        self.set_tasks(taskdata)
         self.actuals = []
         self.forecast = []
 
-    def read_instance(self, f):
-        nrtasks = int(f.readline())
-        for j in xrange(nrtasks):
-            task = Task(self.q, self.nrresources)
-            task.read_instance(f)
-            self.tasks.append(task)
+    def set_tasks(self, taskdata):
+        self.taskdata = taskdata
+        self.tasks = [Task(self, j) for j in xrange(len(taskdata))]
+        # Per task (machineid, start) and whether each was assigned
+        self.assignment = np.zeros((len(taskdata), 2), dtype=int)
+        self.assigned = np.zeros((len(taskdata), 2), dtype=bool)
+        self.invalidate()
+
+    def invalidate(self):
+        # Drop the profiles of compute_usage(), after any change of the
+        # machine events or task assignments
+        self.status = self.usage = self.power = None
+
+    def copy(self):
+        # New Day on the same instance data and prices, without a solution
+        day = Day(self.machinedata, self.q, self.nrresources, self.taskdata)
+        day.actuals = self.actuals
+        day.forecast = self.forecast
+        return day
 
     def read_actual(self, f, nrperiods):
         self.actuals = []
         for i in xrange(nrperiods):
             bits = f.readline().split(" ")
             intervalid = int(bits[0])
-            errlog(len(self.actuals) == intervalid,
+            errlog(self.violations, len(self.actuals) == intervalid,
                    "Actuals price data appears to be specified out of order."
-                   "found interval %d, expected %d." %
-                   (intervalid, len(self.actuals)))
+                   "found interval %d, expected %d.",
+                   intervalid, len(self.actuals))
             price = float(bits[1])  # euro/kWh
             self.actuals.append(price)
 
@@ -199,106 +231,305 @@ class Day(object):
         for i in xrange(nrperiods):
             bits = f.readline().split(" ")
             intervalid = int(bits[0])
-            errlog(len(self.forecast) == intervalid,
+            errlog(self.violations, len(self.forecast) == intervalid,
                    "Forecase price data appears to be specified out of order."
-                   "found interval %d, expected %d." %
-                   (intervalid, len(self.forecast)))
+                   "found interval %d, expected %d.",
+                   intervalid, len(self.forecast))
             price = float(bits[1])  # euro/kWh
             self.forecast.append(price)
 
     def read_solution(self, f):
         # Read Machine events
         nrmachines = int(f.readline())
-        errlog(nrmachines == len(self.machines),
+        errlog(self.violations, nrmachines == len(self.machines),
                "Instance contains a different number of machines."
-               "Expected %d got %d." % (len(self.machines), nrmachines))
+               "Expected %d got %d.", len(self.machines), nrmachines)
         for machine in self.machines:
             machine.read_solution(f)
 
         # Read task assignments
         bits = f.readline().split(" ")
-        errlog(len(bits) == 1,
+        errlog(self.violations, len(bits) == 1,
                "Invalid solution format, expected a single integer for "
-               "the number of tasks, but got %r" % repr(" ".join(bits)))
+               "the number of tasks, but got %r", " ".join(bits))
         nrtasks = int(bits[0])
-        errlog(nrtasks == len(self.tasks),
+        errlog(self.violations, nrtasks == len(self.tasks),
                "Instance contains a different number of tasks."
-               "Expected %d got %d." % (len(self.tasks), nrtasks))
+               "Expected %d got %d.", len(self.tasks), nrtasks)
         for task in self.tasks:
             task.read_solution(f)
 
+    def compute_usage(self):
+        # Compute status, resource usage and power profiles of all machines
+        # at once, using difference arrays and cumulative sums over time.
+        nrmachines = len(self.machines)
+        machineindex = dict((m, i) for i, m in
+                            enumerate(self.machinedata.machineid.tolist()))
+
+        # Machine status: an event holds until the next event of the same
+        # machine, a shutdown takes effect at the end of its time period.
+        evmach = np.array([i for i, m in enumerate(self.machines)
+                           for e in m.events], dtype=int)
+        evaction = np.array([a for m in self.machines for (a, t) in m.events],
+                            dtype=int)
+        evtime = np.array([t for m in self.machines for (a, t) in m.events],
+                          dtype=int)
+        evprev = np.roll(evaction, 1)
+        if len(evmach):
+            evprev[np.r_[True, evmach[1:] != evmach[:-1]]] = 0
+        evbegin = np.clip(evtime + 1 - evaction, 0, self.nrperiods)
+        delta = np.zeros((nrmachines, self.nrperiods + 1), dtype=int)
+        np.add.at(delta, (evmach, evbegin), evaction - evprev)
+        self.status = np.cumsum(delta, axis=1)
+
+        # Cumulative resource use and power of the assigned tasks
+        taskmach = np.array([machineindex.get(m, -1) for m in
+                             self.assignment[:, 0].tolist()], dtype=int)
+        taskmach[~self.assigned[:, 0]] = -1
+        start = self.assignment[:, 1]
+        duration = self.taskdata.duration
+        resourceuse = self.taskdata.resourceuse
+        power = self.taskdata.power
+
+        assigned = taskmach >= 0
+        overrun = assigned & (start + duration > self.nrperiods)
+        for j in np.flatnonzero(overrun):
+            task = self.tasks[j]
+            errlog(self.violations, False,
+                   "Invalid start time %d with duration %d for task %d "
+                   "on machine %d.", task.start, task.duration, task.taskid,
+                   task.machineid, constraint=3, machine=task.machineid,
+                   task=task.taskid)
+
+        taskmach = taskmach[assigned]
+        begin = np.clip(start[assigned], 0, self.nrperiods)
+        end = np.clip(start[assigned] + duration[assigned], 0, self.nrperiods)
+        delta = np.zeros((nrmachines, self.nrperiods + 1, self.nrresources),
+                         dtype=int)
+        np.add.at(delta, (taskmach, begin), resourceuse[assigned])
+        np.add.at(delta, (taskmach, end), -resourceuse[assigned])
+        self.usage = np.cumsum(delta, axis=1)[:, :-1]
+        delta = np.zeros((nrmachines, self.nrperiods + 1), dtype=float)
+        np.add.at(delta, (taskmach, begin), power[assigned])
+        np.add.at(delta, (taskmach, end), -power[assigned])
+        self.power = np.cumsum(delta, axis=1)[:, :-1]
+
     def verify(self):
         for task in self.tasks:
             task.verify()
 
-        # Find tasks running on each machine and compute usage
-        for m in self.machines:
-            assigned = [t for t in self.tasks if t.machineid == m.machineid]
-            m.compute_usage(assigned)
+        self.compute_usage()
+
+        for i, machine in enumerate(self.machines):
+            # Verify that machines are in the correct state for its events
+            for action, time in machine.events:
+                if action == 0:
+                    # Constraint 7
+                    running = 0 <= time < self.nrperiods and \
+                        self.status[i, time] == 1
+                    errlog(self.violations, running,
+                           "Machine %d is not running at time %d but "
+                           "action 0", machine.machineid, time,
+                           constraint=7, machine=machine.machineid,
+                           periods=(time,))
+                elif action == 1 and time > 0:
+                    # Constraint 6
+                    stopped = time <= self.nrperiods and \
+                        self.status[i, time - 1] == 0
+                    errlog(self.violations, stopped,
+                           "Machine %d is running at time %d-1 but "
+                           "action 1", machine.machineid, time,
+                           constraint=6, machine=machine.machineid,
+                           periods=(time - 1,))
+
+            errlog(self.violations, not self.status[i, -1],
+                   "Machine %d must be off at the end of the time period.",
+                   machine.machineid, constraint=8, machine=machine.machineid,
+                   periods=(self.nrperiods,))
+
+            # Constraint 4
+            capacity = self.machinedata.resoursecap[i]
+            for r in np.flatnonzero((self.usage[i] > capacity).any(axis=0)):
+                periods = np.flatnonzero(self.usage[i, :, r] > capacity[r])
+                errlog(self.violations, False,
+                       "Machine %d resource %d capacity %d exceeded in %d "
+                       "time periods (t:%s), maximum use %d.",
+                       machine.machineid, r, capacity[r], len(periods),
+                       periodranges(periods), self.usage[i, :, r].max(),
+                       constraint=4, machine=machine.machineid,
+                       periods=tuple(periods.tolist()))
 
-        for machine in self.machines:
-            machine.verify()
+            # Constraint 9
+            periods = np.flatnonzero((self.usage[i].sum(axis=1) > 0) &
+                                     (self.status[i, :-1] == 0))
+            if len(periods):
+                errlog(self.violations, False,
+                       "Machine %d is down but has jobs in %d time periods "
+                       "(t:%s).", machine.machineid, len(periods),
+                       periodranges(periods), constraint=9,
+                       machine=machine.machineid,
+                       periods=tuple(periods.tolist()))
 
     def compute_costs(self):
-        cj_act = cj_fore = cm_act = cm_fore = cup = cdown = 0.0
-
-        for machine in self.machines:
-            upcost, downcost, idleactual, idlefore, poweractual, powerfore = \
-                machine.compute_costs(self.actuals, self.forecast)
-
-            cup += upcost
-            cdown += downcost
-            cj_act += poweractual
-            cj_fore += powerfore
-            cm_act += idleactual
-            cm_fore += idlefore
-
-        actual = cj_act + cm_act + cup + cdown
-        forecast = cj_fore + cm_fore + cup + cdown
-
-        self.cj_act = cj_act
-        self.cj_fore = cj_fore
-        self.cm_act = cm_act
-        self.cm_fore = cm_fore
-        self.cup = cup
-        self.cdown = cdown
+        prices = [self.forecast]
+        if len(self.actuals):
+            prices.append(self.actuals)
+        costs = self.compute_scenario_costs(prices)
+
+        self.cj_fore = costs['task'][0]
+        self.cm_fore = costs['idle'][0]
+        self.cj_act = self.cm_act = 0.0
+        if len(self.actuals):
+            self.cj_act = costs['task'][1]
+            self.cm_act = costs['idle'][1]
+        self.cup = costs['up'][0]
+        self.cdown = costs['down'][0]
+
+        actual = self.cj_act + self.cm_act + self.cup + self.cdown
+        forecast = self.cj_fore + self.cm_fore + self.cup + self.cdown
         return actual, forecast
 
+    def compute_scenario_costs(self, prices):
+        prices = np.atleast_2d(np.asarray(prices, dtype=float))
+        assert prices.shape[1] == self.nrperiods, \
+            "Price scenarios should have %d time periods, got %d." % \
+            (self.nrperiods, prices.shape[1])
+        if self.status is None:
+            self.compute_usage()
+
+        # Per period task power and idle power over all machines, so that
+        # every scenario only takes a single dot product per cost term.
+        idle = self.machinedata.idle
+        taskpower = self.power.sum(axis=0)
+        idlepower = idle.dot(self.status[:, :-1])
+        nrscenarios = prices.shape[0]
+
+        costs = dict()
+        costs['task'] = prices.dot(taskpower) * self.q / 60
+        costs['idle'] = prices.dot(idlepower) * self.q / 60
+        nrup = np.array([sum(a for a, t in events) for events in self.events])
+        nrdown = np.array([len(events) for events in self.events]) - nrup
+        costs['up'] = np.repeat(self.machinedata.up.dot(nrup), nrscenarios)
+        costs['down'] = np.repeat(self.machinedata.down.dot(nrdown),
+                                  nrscenarios)
+        costs['total'] = costs['task'] + costs['idle'] + \
+            costs['up'] + costs['down']
+        return costs
+
     def __str__(self):
         return "<Day tasks:%d machines:%d>" % \
             (len(self.tasks), len(self.machines))
 
 
-class Task(object):
+class MachineArrays(object):
+    # Machine data of an instance, one array per attribute
+
+    __slots__ = ('machineid', 'idle', 'up', 'down', 'resoursecap')
+
+    def __init__(self, machineid, idle, up, down, resoursecap):
+        self.machineid = np.asarray(machineid, dtype=int)
+        self.idle = np.asarray(idle, dtype=float)
+        self.up = np.asarray(up, dtype=float)
+        self.down = np.asarray(down, dtype=float)
+        self.resoursecap = np.asarray(resoursecap, dtype=int)
+
+    @classmethod
+    def from_data(cls, machines):
+        # From the 'machines' arrays of instance_data.read_instance()
+        return cls(machines['m'], machines['idle'], machines['up'],
+                   machines['down'], machines['res'])
+
+    def __len__(self):
+        return len(self.machineid)
+
+
+class TaskArrays(object):
+    # Task data of an instance, one array per attribute
+
+    __slots__ = ('taskid', 'duration', 'est', 'let', 'power', 'resourceuse')
+
+    def __init__(self, taskid, duration, est, let, power, resourceuse):
+        self.taskid = np.asarray(taskid, dtype=int)
+        self.duration = np.asarray(duration, dtype=int)
+        self.est = np.asarray(est, dtype=int)
+        self.let = np.asarray(let, dtype=int)
+        self.power = np.asarray(power, dtype=float)
+        self.resourceuse = np.asarray(resourceuse, dtype=int)
+
+    @classmethod
+    def empty(cls, nrresources):
+        return cls([], [], [], [], [], np.zeros((0, nrresources)))
+
+    @classmethod
+    def from_data(cls, tasks, nrperiods):
+        # From the 'tasks' arrays of instance_data.read_instance()
+        tasks = cls(tasks['j'], tasks['dur'], tasks['earl'], tasks['late'],
+                    tasks['power'], tasks['usage'])
+
+        assert (tasks.duration > 0).all(), "Internal: invalid durtaion"
+        assert (tasks.est >= 0).all(), "Internal: invalid est"
+        assert (tasks.let <= nrperiods).all(), "Internal: invalid let"
+        assert (tasks.est + tasks.duration <= tasks.let).all(), \
+            "Internal: est+d<let"
+        return tasks
+
+    def __len__(self):
+        return len(self.taskid)
 
-    def __init__(self, q, nrresources):
-        self.q = q
-        self.nrperiods = MINUTESINDAY / q
-        self.nrresources = nrresources
-        self.machineid = self.start = None
 
-    def read_instance(self, f):
-        bits1 = f.readline().strip().split(" ")
-        self.taskid, self.duration, self.est, self.let = map(int, bits1[:4])
-        self.power = float(bits1[4])
-        self.resourceuse = map(int, f.readline().strip().split(" "))
+def column(table, name, cast):
+    # Property reading attribute 'name' of a view from the arrays of its day
+    def get(self):
+        return cast(getattr(getattr(self.day, table), name)[self.index])
+    return property(get)
 
-        assert self.duration > 0, "Internal: invalid durtaion"
-        assert self.est >= 0, "Internal: invalid est"
-        assert self.let <= self.nrperiods, "Internal: invalid let"
-        assert self.est + self.duration <= self.let, "Internal: est+d<let"
-        assert len(self.resourceuse) == self.nrresources, "Internal: nrres"
+
+def assignment(col):
+    # Property for the per-solution (machineid, start) of a task view
+    def get(self):
+        if not self.day.assigned[self.index, col]:
+            return None
+        return int(self.day.assignment[self.index, col])
+
+    def set(self, value):
+        self.day.assigned[self.index, col] = value is not None
+        if value is not None:
+            self.day.assignment[self.index, col] = value
+        self.day.invalidate()
+    return property(get, set)
+
+
+class Task(object):
+    # Thin view on task 'index' of the arrays of a Day
+
+    __slots__ = ('day', 'index')
+
+    taskid = column('taskdata', 'taskid', int)
+    duration = column('taskdata', 'duration', int)
+    est = column('taskdata', 'est', int)
+    let = column('taskdata', 'let', int)
+    power = column('taskdata', 'power', float)
+    resourceuse = column('taskdata', 'resourceuse', np.asarray)
+    machineid = assignment(0)
+    start = assignment(1)
+    q = property(lambda self: self.day.q)
+    nrperiods = property(lambda self: self.day.nrperiods)
+    nrresources = property(lambda self: self.day.nrresources)
+
+    def __init__(self, day, index):
+        self.day = day
+        self.index = index
 
     def read_solution(self, f):
         bits = f.readline().split(" ")
-        errlog(len(bits) == 3,
+        errlog(self.day.violations, len(bits) == 3,
                "Invalid solution format for task %d, expected 3 integers "
-               "but got %r" % (self.taskid, repr(" ".join(bits))))
+               "but got %r", self.taskid, " ".join(bits))
         taskid, self.machineid, self.start = map(int, bits)
 
-        errlog(taskid == self.taskid,
+        errlog(self.day.violations, taskid == self.taskid,
                "TaskID mismatch, are the tasks specified out of order?"
-               "Expected %d, got %d." % (self.taskid, taskid))
+               "Expected %d, got %d.", self.taskid, taskid)
 
     # data = dict({'Machine': int, 'Task': int, Time: int})
     def load_solution(self, taskid, machid, start):
@@ -306,24 +537,26 @@ class Task(object):
         self.machineid = int(machid)
         self.start = int(start)
 
-        errlog(taskid == self.taskid,
+        errlog(self.day.violations, taskid == self.taskid,
                "TaskID mismatch, is there a task missing or specified out of order?"
-               "Expected %d, got %d." % (self.taskid, taskid))
+               "Expected %d, got %d.", self.taskid, taskid)
 
     def verify(self):
         # Checks that a task has a valid start/end times
         # Does not check resource use, that is done by the machine.
 
         # Constraint 2
-        errlog(self.start >= self.est,
-               "Task %d starting at %d is before its earliest start time %d." %
-               (self.taskid, self.start, self.est))
+        errlog(self.day.violations, self.start >= self.est,
+               "Task %d starting at %d is before its earliest start time %d.",
+               self.taskid, self.start, self.est, constraint=2,
+               machine=self.machineid, task=self.taskid)
 
         # Constraint 3
         ends = self.start + self.duration
-        errlog(ends <= self.let,
-               "Task %d ending at %d is after its latest end time %d." %
-               (self.taskid, ends, self.let))
+        errlog(self.day.violations, ends <= self.let,
+               "Task %d ending at %d is after its latest end time %d.",
+               self.taskid, ends, self.let, constraint=3,
+               machine=self.machineid, task=self.taskid)
 
     def __str__(self):
         assignstr = ""
@@ -334,43 +567,62 @@ class Task(object):
 
 
 class Machine(object):
-
-    def __init__(self, q, nrresources):
-        self.q = q
-        self.nrperiods = MINUTESINDAY / q
-        self.nrresources = nrresources
-        self.status = None
-        self.events = None
-        self.idlecost = self.upcost = self.downcost = None
-
-    def read_instance(self, f):
-        bits1 = f.readline().strip().split(" ")
-        self.machineid = int(bits1[0])
-        self.idle, self.up, self.down = map(float, bits1[1:])
-        self.resoursecap = map(int, f.readline().strip().split(" "))
+    # Thin view on machine 'index' of the arrays of a Day
+
+    __slots__ = ('day', 'index')
+
+    machineid = column('machinedata', 'machineid', int)
+    idle = column('machinedata', 'idle', float)
+    up = column('machinedata', 'up', float)
+    down = column('machinedata', 'down', float)
+    resoursecap = column('machinedata', 'resoursecap', np.asarray)
+    q = property(lambda self: self.day.q)
+    nrperiods = property(lambda self: self.day.nrperiods)
+    nrresources = property(lambda self: self.day.nrresources)
+
+    def __init__(self, day, index):
+        self.day = day
+        self.index = index
+
+    @property
+    def events(self):
+        return self.day.events[self.index]
+
+    @events.setter
+    def events(self, events):
+        self.day.events[self.index] = events
+        self.day.invalidate()
+
+    # Profiles computed by Day.compute_usage()
+    status = property(lambda self: None if self.day.status is None
+                      else self.day.status[self.index])
+    usage = property(lambda self: None if self.day.usage is None
+                     else self.day.usage[self.index])
+    power = property(lambda self: None if self.day.power is None
+                     else self.day.power[self.index])
 
     def read_solution(self, f):
         bits = f.readline().split(" ")
-        errlog(len(bits) == 1,
+        errlog(self.day.violations, len(bits) == 1,
                "Invalid solution format for machine, expected a single integer"
-               "for machine ID but got %r" % repr(" ".join(bits)))
+               "for machine ID but got %r", " ".join(bits))
         machineid = int(bits[0])
-        errlog(machineid == self.machineid,
+        errlog(self.day.violations, machineid == self.machineid,
                "MachineID mismatch, are the machines specified out of order?"
-               "Expected %d, got %d." % (self.machineid, machineid))
+               "Expected %d, got %d.", self.machineid, machineid)
 
         bits = f.readline().split(" ")
-        errlog(len(bits) == 1,
+        errlog(self.day.violations, len(bits) == 1,
                "Invalid solution format for machine %d, expected a single "
-               "integer for number of events, but got %r" %
-               (self.machineid, repr(" ".join(bits))))
+               "integer for number of events, but got %r",
+               self.machineid, " ".join(bits))
         nrevents = int(bits[0])
         events = []
         for i in xrange(nrevents):
             bits = map(int, f.readline().strip().split(" "))
-            errlog(len(bits) == 2,
+            errlog(self.day.violations, len(bits) == 2,
                    "Machine event lines should only contina two values, "
-                   "1/0 for on/off and the timepoint. Found %d instead of 2" %
+                   "1/0 for on/off and the timepoint. Found %d instead of 2",
                    len(bits))
             action, time = bits
             events.append((action, time))
@@ -382,97 +634,68 @@ class Machine(object):
         # always on (first on, last off)
         self.events = [(1,0), (0,self.nrperiods-1)] # [on, off]
 
-    def compute_usage(self, assigned):
-        # Compute the up/down status of the machine over the time horizon
-        # Off initially at all time points. +1 for verifying its off at end
-        self.status = [0] * (self.nrperiods + 1)
-        for i, (action, time) in enumerate(self.events):
-            endtime = self.nrperiods
-            if i + 1 < len(self.events):
-                endtime = self.events[i + 1][1] + 1
-
-            if action == 0:
-                time += 1  # Shutdown takes place at the end of time period
-
-            # Set the status of the machine between these time points
-            self.status[time:endtime] = [action] * (endtime - time)
-
-        # Compute cumulative resouce use
-        self.usage = [[0] * self.nrresources for i in xrange(self.nrperiods)]
-        self.power = [0] * self.nrperiods
-        for task in assigned:
-            errlog(task.start + task.duration <= self.nrperiods,
-                   "Invalid start time %d with duration %d for task %d "
-                   "on machine %d." % (task.start, task.duration, task.taskid,
-                                       task.machineid))
+    def __str__(self):
+        return "<Machine %d [%s]> " % \
+            (self.machineid, ",".join(map(str, self.resoursecap)))
 
-            for t in xrange(task.start, task.start + task.duration):
-                for r, use in enumerate(task.resourceuse):
-                    self.usage[t][r] += use
-                self.power[t] += task.power
 
-    def verify(self):
-        # Verify that machines are in the correct state for specified events
-        for i, (action, time) in enumerate(self.events):
-            if action == 0:
-                # Constraint 7
-                errlog(self.status[time] == 1,
-                       "Machine %d is not running at time %d but action 0" %
-                       (self.machineid, time))
-                time += 1  # Shutdown takes place at the end of time period
-
-            elif action == 1 and time > 0:
-                # Constraint 6
-                errlog(self.status[time - 1] == 0,
-                       "Machine %d is running at time %d-1 but action 1" %
-                       (self.machineid, time))
-
-        errlog(not self.status[-1],
-               "Machine %d must be off at the end of the time period." %
-               (self.machineid))
-
-        for t, resourceuse in enumerate(self.usage):
-            for r, use in enumerate(resourceuse):
-                # Constraint 4
-                errlog(use <= self.resoursecap[r],
-                       "Machine %d t:%d resource %d capacity %d exceeded %d." %
-                       (self.machineid, t, r, self.resoursecap[r], use))
+def periodranges(periods):
+    # Compact string of sorted time periods, e.g. "3-5,9"
+    ranges = []
+    for t in periods:
+        if ranges and ranges[-1][1] == t - 1:
+            ranges[-1][1] = t
+        else:
+            ranges.append([t, t])
+    return ",".join(("%d" % a) if a == b else ("%d-%d" % (a, b))
+                    for a, b in ranges)
 
-            # Constraint 9
-            if sum(resourceuse) > 0:  # Is there activity?
-                errlog(self.usage[t],
-                       "Machine %d is down but has jobs at time period %d." %
-                       (self.machineid, t))
-
-    def compute_costs(self, actuals, forecasts):
-        # Compute up and down costs
-        upcost = self.up * sum(a for a, t in self.events)
-        downcost = self.down * sum(1 - a for a, t in self.events)
-
-        # Idle cost of running the machine
-        idleactual = idlefore = 0.0
-        for t, state in enumerate(self.status[:-1]):
-            if actuals:
-                idleactual += state * self.idle * actuals[t] * self.q / 60
-            idlefore += state * self.idle * forecasts[t] * self.q / 60
-
-        # Power consumption by running tasks
-        poweractual = powerfore = 0.0
-        for t, power in enumerate(self.power):
-            if actuals:
-                poweractual += power * actuals[t] * self.q / 60
-            powerfore += power * forecasts[t] * self.q / 60
-
-        return upcost, downcost, idleactual, idlefore, poweractual, powerfore
 
-    def __str__(self):
-        return "<Machine %d [%s]> " % \
-            (self.machineid, ",".join(map(str, self.resoursecap)))
+Violation = namedtuple('Violation',
+                       ['constraint', 'machine', 'task', 'periods', 'message'])
+
+
+class FailFast(Exception):
+    # Raised at the first violation by a fail-fast Violations collector
+    pass
+
+
+class Violations(object):
+
+    def __init__(self, failfast=False):
+        self.failfast = failfast
+        self.records = []  # Violation tuples, in the order they were found
+        self.counts = dict()  # constraint -> number of violations
+
+    def add(self, message, constraint=None, machine=None, task=None,
+            periods=()):
+        # constraint is None for errors in the input format
+        self.records.append(Violation(constraint, machine, task, periods,
+                                      message))
+        self.counts[constraint] = self.counts.get(constraint, 0) + 1
+        if self.failfast:
+            raise FailFast(message)
+
+    def add_exception(self, e):
+        # Record an exception that aborted reading or verifying
+        self.records.append(Violation(None, None, None, (),
+                                      "%s %s" % (type(e), str(e))))
+        self.counts[None] = self.counts.get(None, 0) + 1
+
+    def getstring(self):
+        return "".join("ERROR: %s\n" % v.message for v in self.records)
+
+    def __len__(self):
+        return len(self.records)
+
+    def __iter__(self):
+        return iter(self.records)
 
 
-def errlog(truthtest, msg, *args, **kwargs):
+def errlog(violations, truthtest, msg, *args, **record):
+    # The message is only formatted when the test fails
     if not truthtest:
-        logging.error(msg, *args, **kwargs)
+        violations.add(msg % args, **record)
 
 
 def main(folder):
@@ -485,7 +708,7 @@ def main(folder):
         actual, forecast = instance.compute_costs()
 
     except Exception as e:
-        print >> instance.errstream, type(e), str(e)
+        instance.violations.add_exception(e)
 
     errstr = instance.geterrorstring()
     if errstr:
@@ -0,0 +1,119 @@
+#!/usr/bin/env python
+
+"""
+    Batch checker: verifies every solution found in a tree of instance
+    folders, e.g. all load1..load8 x start day submissions at once.
+
+        Usage: python checker_batch.py [-j 4] [--format json] dir [dir ...]
+
+    Every folder containing an instance.txt and a solution.txt and/or a
+    MiniZinc minizinc.out is checked (forecast.txt is needed, actual.txt is
+    used when present). Folders are checked in a pool of worker processes
+    and one CSV or JSON line per solution is printed as soon as it is done,
+    in the order the folders were found. With --failfast, checking a
+    solution stops at its first violation (for quick feasibility screening).
+"""
+
+import sys
+import os
+import argparse
+import json
+import multiprocessing
+
+from checker import *
+import checker_mzn as chkmzn
+
+FIELDS = ['folder', 'solution', 'valid', 'nrerrors',
+          'cost_forecast', 'cost_actual', 'error']
+
+
+def find_solutions(roots):
+    # [(folder, solution basename)] for all solutions below 'roots'
+    found = []
+    for root in roots:
+        for (folder, dirs, files) in os.walk(root):
+            dirs.sort()
+            if INSTANCEBASENAME not in files:
+                continue
+            for fname in (SOLUTIONBASENAME, chkmzn.MZNSOLUTIONBASENAME):
+                if fname in files:
+                    found.append((folder, fname))
+    return found
+
+
+def check_solution(job):
+    (folder, fname, failfast) = job
+    instance = Instance(failfast=failfast)
+    res = dict(folder=folder, solution=fname,
+               cost_forecast=None, cost_actual=None)
+
+    try:
+        if fname == chkmzn.MZNSOLUTIONBASENAME:
+            instance.read_instancefolder(folder, solution=False)
+            with open(join(folder, fname), "rt") as f:
+                chkmzn.read_mznsolution(instance, f)
+        else:
+            instance.read_instancefolder(folder)
+        instance.verify()
+        actual, forecast = instance.compute_costs()
+        res['cost_forecast'] = float(forecast)
+        if instance.actualsread:
+            res['cost_actual'] = float(actual)
+
+    except FailFast:
+        pass
+    except Exception as e:
+        instance.violations.add_exception(e)
+
+    errors = instance.geterrorstring().splitlines()
+    res['valid'] = not errors
+    res['nrerrors'] = len(errors)
+    res['error'] = errors[0] if errors else ""
+    return res
+
+
+def format_csv(res):
+    def fmt(v):
+        if isinstance(v, float):
+            return "%.4f" % v
+        if v is None:
+            return "-"
+        return str(v).replace(";", ",")
+    return "; ".join(fmt(res[k]) for k in FIELDS)
+
+
+def main(roots, jobs=None, fmt='csv', out=sys.stdout, failfast=False):
+    solutions = [(folder, fname, failfast)
+                 for (folder, fname) in find_solutions(roots)]
+    if fmt == 'csv':
+        print >> out, "; ".join(FIELDS)
+
+    pool = multiprocessing.Pool(jobs)
+    try:
+        for res in pool.imap(check_solution, solutions):
+            if fmt == 'json':
+                print >> out, json.dumps(res, sort_keys=True)
+            else:
+                print >> out, format_csv(res)
+            out.flush()
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Verify all solutions in a tree of instance folders")
+    parser.add_argument("folders", nargs='+', help="root directories to search for instance folders")
+    parser.add_argument("-j", "--jobs", help="number of worker processes (default = number of cpus)", type=int)
+    parser.add_argument("--format", help="output format, 'csv' or 'json' (one object per line)", choices=['csv', 'json'], default='csv')
+    parser.add_argument("--out", help="file to write the results to (default = stdout)")
+    parser.add_argument("--failfast", help="stop checking a solution at its first violation", action="store_true")
+    args = parser.parse_args()
+
+    out = sys.stdout
+    if args.out:
+        out = open(args.out, 'w')
+    main(args.folders, jobs=args.jobs, fmt=args.format, out=out,
+         failfast=args.failfast)
+    if args.out:
+        out.close()
@@ -0,0 +1,148 @@
+#!/usr/bin/env python
+
+"""
+    Incremental evaluation of single-task moves on a checked schedule.
+
+    Keeps the per-machine resource and power profiles of a checker Day and
+    answers "move task j to machine m at start s" and "swap two tasks" with
+    the change in cost and in number of violations, in time proportional
+    to the durations of the tasks involved.
+
+        inc = IncrementalDay(instance.day)
+        dcost, dviol = inc.move(j, m, s)
+        if dviol <= 0 and dcost < 0:
+            inc.commit()    # write the new assignments back to the tasks
+        else:
+            inc.rollback()  # undo all moves since the last commit
+
+    Violations count the overloaded (machine, time period, resource)
+    cells, the time periods in which a machine is down but has jobs, and
+    the tasks outside of their [est, let) window. Machine on/off events are
+    kept fixed, so the idle, up and down costs do not change.
+"""
+
+import numpy as np
+from checker import *
+
+
+class IncrementalDay(object):
+
+    def __init__(self, day, prices=None):
+        if prices is None:
+            prices = day.forecast
+        self.day = day
+        self.nrperiods = day.nrperiods
+        self.machineindex = dict((m.machineid, i)
+                                 for i, m in enumerate(day.machines))
+
+        self.est = day.taskdata.est
+        self.let = day.taskdata.let
+        self.duration = day.taskdata.duration
+        self.taskpower = day.taskdata.power
+        self.resourceuse = day.taskdata.resourceuse
+        self.machine = np.array([self.machineindex[m] for m in
+                                 day.assignment[:, 0].tolist()], dtype=int)
+        self.start = day.assignment[:, 1].copy()
+        assert (self.start >= 0).all() and \
+            (self.start + self.duration <= self.nrperiods).all(), \
+            "All tasks should be scheduled within the time horizon."
+
+        # Own copies of the profiles, updated in place by every move
+        day.compute_usage()
+        self.usage = day.usage.copy()
+        self.power = day.power.copy()
+        self.capacity = day.machinedata.resoursecap
+        self.down = day.status[:, :-1] == 0
+
+        # Energy price of running one unit of power from 0 up to period t
+        self.cumprice = np.r_[0.0, np.cumsum(prices)] * day.q / 60
+
+        self.cost = day.compute_scenario_costs([prices])['total'][0]
+        self.violations = self._violations(self.usage, self.capacity,
+                                           self.down) + \
+            int(((self.start < self.est) |
+                 (self.start + self.duration > self.let)).sum())
+        self.journal = []  # (task, machine index, start) before each change
+
+    def _violations(self, usage, capacity, down):
+        return int((usage > capacity[..., np.newaxis, :]).sum() +
+                   ((usage.sum(axis=-1) > 0) & down).sum())
+
+    def _place(self, j, mi, s, sign):
+        # Add (sign=1) or remove (sign=-1) task j at machine index mi and
+        # start s, returns the change in cost and in violations.
+        end = s + self.duration[j]
+        usage = self.usage[mi, s:end]
+        down = self.down[mi, s:end]
+        before = self._violations(usage, self.capacity[mi], down)
+        usage += sign * self.resourceuse[j]
+        self.power[mi, s:end] += sign * self.taskpower[j]
+        after = self._violations(usage, self.capacity[mi], down)
+
+        outside = s < self.est[j] or end > self.let[j]
+        dcost = sign * self.taskpower[j] * \
+            (self.cumprice[end] - self.cumprice[s])
+        return dcost, after - before + sign * int(outside)
+
+    def _relocate(self, j, mi, s):
+        if not 0 <= s <= self.nrperiods - self.duration[j]:
+            raise ValueError("Start %d of task %d is outside the time "
+                             "horizon." % (s, self.day.tasks[j].taskid))
+        dcost1, dviol1 = self._place(j, self.machine[j], self.start[j], -1)
+        dcost2, dviol2 = self._place(j, mi, s, 1)
+        self.machine[j] = mi
+        self.start[j] = s
+        self.cost += dcost1 + dcost2
+        self.violations += dviol1 + dviol2
+        return dcost1 + dcost2, dviol1 + dviol2
+
+    def move(self, j, machineid, start):
+        """
+            Move the task at index j to machine 'machineid' at 'start'.
+            Returns (delta cost, delta violations).
+        """
+        mi = self.machineindex[machineid]
+        self.journal.append((j, self.machine[j], self.start[j]))
+        try:
+            return self._relocate(j, mi, start)
+        except ValueError:
+            self.journal.pop()
+            raise
+
+    def swap(self, j1, j2):
+        """
+            Exchange the machines and start times of the tasks at index
+            j1 and j2. Returns (delta cost, delta violations).
+        """
+        m1, s1 = self.machine[j1], self.start[j1]
+        m2, s2 = self.machine[j2], self.start[j2]
+        for (j, s) in ((j1, s2), (j2, s1)):
+            if not 0 <= s <= self.nrperiods - self.duration[j]:
+                raise ValueError("Start %d of task %d is outside the time "
+                                 "horizon." % (s, self.day.tasks[j].taskid))
+        self.journal.append((j1, m1, s1))
+        self.journal.append((j2, m2, s2))
+        dcost1, dviol1 = self._relocate(j1, m2, s2)
+        dcost2, dviol2 = self._relocate(j2, m1, s1)
+        return dcost1 + dcost2, dviol1 + dviol2
+
+    def commit(self):
+        # Write the changed assignments back to the tasks of the day
+        for j in set(j for (j, mi, s) in self.journal):
+            task = self.day.tasks[j]
+            task.machineid = self.day.machines[self.machine[j]].machineid
+            task.start = int(self.start[j])
+        self.journal = []
+
+    def rollback(self):
+        # Undo all moves since the last commit, in reverse order
+        while self.journal:
+            j, mi, s = self.journal.pop()
+            self._relocate(j, mi, s)
+
+    def feasible(self):
+        return self.violations == 0
+
+    def __str__(self):
+        return "<IncrementalDay cost:%.4f violations:%d pending:%d>" % \
+            (self.cost, self.violations, len(self.journal))
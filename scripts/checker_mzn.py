@@ -3,6 +3,9 @@
 MZNSOLUTIONBASENAME = "minizinc.out"
 
 import sys
+import re
+import json
+import numpy as np
 sys.path.append('../')
 from checker import *
 
@@ -21,13 +24,15 @@ def print_instance(instance):
             print "Task costs:    %12.4f" % d.cj_fore
 
 def print_instance_csv(f_inst, f_fore, instance, timing=None, header=True):
-    d = instance.day
-    actual, forecast = instance.compute_costs()
-
-    d_cj_fore = "%.4f"%d.cj_fore
+    # instance None (no verified solution, e.g. at a time limit): costs '-'
+    d_cj_fore = "-"
     d_cj_act = "-"
-    if instance.actualsread:
-        d_cj_act = "%.4f"%d.cj_act
+    if instance is not None:
+        d = instance.day
+        actual, forecast = instance.compute_costs()
+        d_cj_fore = "%.4f"%d.cj_fore
+        if instance.actualsread:
+            d_cj_act = "%.4f"%d.cj_act
 
     msg_timing = ""
     csv_timing = ""
@@ -52,7 +57,87 @@ def pretty_print(instance):
             out += " :: Task %i"%t.taskid
             print out
 
-def read_mznsolution(instance, f):
+class MznSolutionError(Exception):
+    pass
+
+# the usual line first, fields in any order as fallback
+_TASKLINE = re.compile(r'\s*Machine=(-?\d+),Start=(-?\d+),Task=(-?\d+)\s*$')
+_FIELD = re.compile(r'(Machine|Start|Task|Cost)=([^,]*)')
+
+def _parse_text(lines, nrtasks):
+    # (cost, machine, start) of one solution in the text output, offset 0
+    machine = np.full(nrtasks, -1, dtype=int)
+    start = np.full(nrtasks, -1, dtype=int)
+    cost = None
+    for line in lines:
+        match = _TASKLINE.match(line)
+        if match:
+            (m, s, t) = match.groups()
+        else:
+            elems = dict(_FIELD.findall(line))
+            if 'Cost' in elems:
+                cost = elems['Cost'].strip()
+            if not ('Machine' in elems and 'Start' in elems and 'Task' in elems):
+                continue
+            (m, s, t) = (elems['Machine'], elems['Start'], elems['Task'])
+        t = int(t)-1
+        if not 0 <= t < nrtasks:
+            raise MznSolutionError("Task id '%i' in the solution is not in the instance"%(t+1))
+        machine[t] = int(m)-1
+        start[t] = int(s)-1
+    return (cost, machine, start)
+
+def _parse_json(text, nrtasks):
+    # (cost, machine, start) of one solution of --output-mode json: either
+    # arrays 'machine' and 'start' per task (offset 1) or the 0/1 array
+    # 'x'[task][machine][time] of energy-skeleton.mzn
+    try:
+        sol = json.loads(text)
+    except ValueError as e:
+        raise MznSolutionError("Invalid JSON solution: %s"%e)
+    cost = None
+    for key in ('Cost', 'c_task', '_objective'):
+        if key in sol:
+            cost = str(sol[key])
+    machine = np.full(nrtasks, -1, dtype=int)
+    start = np.full(nrtasks, -1, dtype=int)
+    if 'machine' in sol and 'start' in sol:
+        n = min(nrtasks, len(sol['machine']), len(sol['start']))
+        machine[:n] = np.asarray(sol['machine'][:n], dtype=int) - 1
+        start[:n] = np.asarray(sol['start'][:n], dtype=int) - 1
+    elif 'x' in sol:
+        (t, m, s) = np.nonzero(np.asarray(sol['x'], dtype=int)[:nrtasks])
+        machine[t] = m
+        start[t] = s
+    else:
+        raise MznSolutionError("JSON solution without 'machine' and 'start' or 'x'")
+    return (cost, machine, start)
+
+def iter_mznsolutions(f, nrtasks):
+    # streams over the lines of MiniZinc output (a file or a list), yields
+    # (cost, machine array, start array) per solution as soon as its
+    # '----------' line is read; offset 0, -1 for tasks not in the solution
+    # output without any separator is one solution (old minizinc.out files)
+    block = []
+    for line in f:
+        if line.startswith('----------'):
+            yield _parse_block(block, nrtasks)
+            block = []
+        elif line.startswith('====='): # search complete, unsat, unknown
+            block = []
+        elif line.strip():
+            block.append(line)
+    if block:
+        yield _parse_block(block, nrtasks)
+
+def _parse_block(block, nrtasks):
+    if block and block[0].lstrip().startswith('{'):
+        return _parse_json("\n".join(block), nrtasks)
+    return _parse_text(block, nrtasks)
+
+def read_mznsolution(instance, f, solution=-1):
+        # loads the last (or the solution-th, from 0) solution in f
+        # raises MznSolutionError when it is not there or incomplete
         assert instance.instanceread, \
             "Please read in the instance before the solution."
         # Fake Machine events
@@ -60,32 +145,23 @@ def read_mznsolution(instance, f):
             machine.fake_solution()
 
         # Load task assignments
-        if True:
-            cost = None
-            tasks = [] # tuples (task, machine, start)
-            for line in f:
-                if not line.startswith('-------') and not line.startswith('======='):
-                    fields = line.strip().split(',')
-                    elems = dict()
-                    for fie in fields:
-                        pos = fie.find('=')
-                        elems[fie[:pos]] = fie[pos+1:]
-                    if 'Cost' in elems.keys():
-                        cost = elems['Cost']
-                    if set(['Machine', 'Task', 'Start']) == set(elems.keys()):
-                        # make offset 0 (from offset 1)
-                        t = int(elems['Task'])-1
-                        m = int(elems['Machine'])-1
-                        s = int(elems['Start'])-1
-                        tasks.append( (t,m,s) )
-            tasks_by_id = sorted(tasks)
-            #print cost, tasks_by_id
-            for (i,task) in enumerate(instance.day.tasks):
-                if i >= len(tasks_by_id):
-                    print "Error: no task with id '%i' in the solution?"%i
-                    sys.exit(1)
-                (t,m,s) = tasks_by_id[i]
-                task.load_solution(t,m,s)
+        nrtasks = len(instance.day.tasks)
+        found = None
+        for (i, sol) in enumerate(iter_mznsolutions(f, nrtasks)):
+            found = sol
+            if i == solution:
+                break
+        else:
+            if solution >= 0:
+                raise MznSolutionError("No solution %i in the output"%solution)
+        if found is None:
+            raise MznSolutionError("No solution in the output")
+        (cost, machine, start) = found
+        missing = np.flatnonzero(machine < 0)
+        if len(missing):
+            raise MznSolutionError("No task with id '%i' in the solution"%missing[0])
+        for (i,task) in enumerate(instance.day.tasks):
+            task.load_solution(i, machine[i], start[i])
         instance.solutionread = True
 
 
@@ -109,7 +185,11 @@ if __name__ == '__main__':
         # read minizinc solution
         solutionfname = join(folder, MZNSOLUTIONBASENAME)
         with open(solutionfname, "rt") as f:
-            read_mznsolution(instance, f)
+            try:
+                read_mznsolution(instance, f)
+            except MznSolutionError as e:
+                print >> sys.stderr, "Error: %s"%e
+                sys.exit(1)
 
         instance.verify()
         errstr = instance.geterrorstring()
@@ -14,13 +14,16 @@ cwd=os.path.dirname(os.path.realpath(__file__))
 sys.path.append(os.path.join(cwd,'scripts'))
 from prices_data import *
 from checker import *
+from startcosts import instance_start_costs
 
 
-def instance2arr(instance):
+def instance2arr(instance, data_actual):
+    # 'cost' holds the actual cost of each start time from est to let-dur
+    costs = instance_start_costs(instance, data_actual)
     tasks = [] 
-    for t in instance.day.tasks:
-        tasks.append( {'est':t.est, 'let':t.let, 'dur':t.duration, 'pow':t.power} )
-#            costs[i] = sum([t.power*day.actuals[j]*t.q/60.0 for j in range(i, i+t.duration)])
+    for (j,t) in enumerate(instance.day.tasks):
+        tasks.append( {'est':t.est, 'let':t.let, 'dur':t.duration, 'pow':t.power,
+                       'cost':costs[j,t.est:t.let-t.duration+1].tolist()} )
     return tasks
     
 
@@ -74,7 +77,7 @@ if __name__ == '__main__':
                 instance.read_instance(f)
 
                 f_name = os.path.basename(f)
-                res[load][day_str][f_name] = dict({'q': instance.day.q, 'act': data_actual, 'tasks': instance2arr(instance)})
+                res[load][day_str][f_name] = dict({'q': instance.day.q, 'act': data_actual, 'tasks': instance2arr(instance, data_actual)})
 
     with open(args.out, 'w') as f_out:
         json.dump(res, f_out)
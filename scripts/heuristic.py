@@ -0,0 +1,191 @@
+#!/usr/bin/env python
+# native scheduling heuristic, a fast alternative to solving with MiniZinc
+#
+# greedy cheapest-window insertion: tasks are inserted one by one, hardest
+# first, at the cheapest start time (see startcosts.py) on any machine that
+# has enough free resources during the whole run of the task; followed by
+# local search that removes each task and reinserts it at its cheapest
+# feasible position, until no task can be moved to a cheaper start. This is
+# repeated for a few insertion orders and the cheapest schedule is kept.
+#
+# like the MiniZinc models of the course it only minimizes the task costs,
+# machines are always on (see checker_mzn.read_mznsolution)
+
+import sys
+import time
+import numpy as np
+
+from checker import *
+import instance_data
+import startcosts
+
+
+def fitting_starts(free, use, dur):
+    # (machines x periods) mask: task fits when started there on that machine
+    # free: (machines x periods x resources) free capacity
+    ok = (free >= use).all(axis=2)
+    nr_periods = ok.shape[1]
+    nr_bad = np.zeros((ok.shape[0], nr_periods+1), dtype=int)
+    np.cumsum(~ok, axis=1, out=nr_bad[:,1:])
+    fits = np.zeros(ok.shape, dtype=bool)
+    fits[:,:nr_periods-dur+1] = (nr_bad[:,dur:] - nr_bad[:,:nr_periods-dur+1]) == 0
+    return fits
+
+class Schedule(object):
+    # assignment of all tasks with the free capacity it leaves on the machines
+
+    def __init__(self, data, costs):
+        tasks = data['tasks']
+        (self.dur, self.use) = (tasks['dur'], tasks['usage'])
+        self.costs = costs
+        cap = data['machines']['res']
+        (nr_tasks, nr_periods) = costs.shape
+        self.free = np.repeat(cap[:,np.newaxis,:], nr_periods, axis=1).astype(int)
+        self.machine = np.zeros(nr_tasks, dtype=int)
+        self.start = np.zeros(nr_tasks, dtype=int)
+        self.taskcost = np.zeros(nr_tasks)
+        self.nr_unplaced = 0
+
+    def cost(self):
+        return self.taskcost.sum()
+
+    def best_position(self, j):
+        # cheapest (cost, machine, start) where task j fits, or None
+        fits = fitting_starts(self.free, self.use[j], self.dur[j])
+        cand = np.where(fits, self.costs[j][np.newaxis,:], np.inf)
+        (m, s) = np.unravel_index(np.argmin(cand), cand.shape)
+        if np.isinf(cand[m,s]):
+            return None
+        return (cand[m,s], m, s)
+
+    def place(self, j, pos):
+        (self.taskcost[j], self.machine[j], self.start[j]) = pos
+        self.free[self.machine[j],self.start[j]:self.start[j]+self.dur[j]] -= self.use[j]
+
+    def unplace(self, j):
+        self.free[self.machine[j],self.start[j]:self.start[j]+self.dur[j]] += self.use[j]
+
+    def insert(self, order):
+        # greedy insertion of the tasks in 'order'
+        for j in order:
+            pos = self.best_position(j)
+            if pos is None:
+                # no room: cheapest start on the machine with most free capacity
+                self.nr_unplaced += 1
+                s = int(np.argmin(self.costs[j]))
+                m = int(np.argmax(self.free[:,s:s+self.dur[j]].min(axis=(1,2))))
+                pos = (self.costs[j][s], m, s)
+            self.place(j, pos)
+
+    def improve(self, order, max_passes=100):
+        # local search: move tasks to a cheaper feasible position
+        for it in xrange(max_passes):
+            improved = False
+            for j in order:
+                self.unplace(j)
+                pos = self.best_position(j)
+                if pos is not None and pos[0] < self.taskcost[j] - 1e-9:
+                    improved = True
+                else:
+                    pos = (self.taskcost[j], self.machine[j], self.start[j])
+                self.place(j, pos)
+            if not improved:
+                break
+
+
+def schedule(data, prices, tries=10, seed=0):
+    # data: from instance_data.read_instance(), prices: one per time period
+    # greedy insertion + local search for several task orders: hardest first
+    # by resource use x duration, by tightness of the time window, by resource
+    # use, then random; returns the best Schedule (fewest unplaced tasks, then
+    # lowest cost)
+    costs = startcosts.data_start_costs(data, prices)
+    tasks = data['tasks']
+    (dur, use) = (tasks['dur'], tasks['usage'].sum(axis=1))
+    slack = tasks['late'] - tasks['earl'] - dur
+    orders = [np.argsort(-use*dur, kind='mergesort'),
+              np.lexsort((-use*dur, slack)),
+              np.argsort(-use, kind='mergesort')]
+    rand = np.random.RandomState(seed)
+
+    best = None
+    for k in xrange(tries):
+        order = orders[k] if k < len(orders) else rand.permutation(len(dur))
+        sched = Schedule(data, costs)
+        sched.insert(order)
+        if sched.nr_unplaced == 0:
+            sched.improve(order)
+        if best is None or (sched.nr_unplaced, sched.cost()) < (best.nr_unplaced, best.cost()):
+            best = sched
+    return best
+
+def independent_optimum(data, prices):
+    # every task at its own cheapest start (see startcosts.py), which gives
+    # a lower bound on the task costs, packed onto the machines first fit
+    # decreasing (largest resource use x duration first, on the machine with
+    # the least capacity left); when all tasks fit the schedule is optimal
+    # and returned, else None
+    costs = startcosts.data_start_costs(data, prices)
+    (starts, best) = startcosts.cheapest_starts(costs)
+    tasks = data['tasks']
+    (dur, use) = (tasks['dur'], tasks['usage'])
+    sched = Schedule(data, costs)
+    for j in np.argsort(-use.sum(axis=1)*dur, kind='mergesort'):
+        window = sched.free[:,starts[j]:starts[j]+dur[j]]
+        left = window.min(axis=1) - use[j] # (machines x resources)
+        fits = (left >= 0).all(axis=1)
+        if not fits.any():
+            return None
+        m = np.flatnonzero(fits)[np.argmin(left[fits].sum(axis=1))]
+        sched.place(j, (best[j], m, starts[j]))
+    return sched
+
+def schedule_to_instance(file_instance, data, sched, data_forecasts, data_actual=None, verbose=0):
+    # verified checker Instance of a Schedule, or None
+    instance = Instance()
+    instance.read_instance(file_instance)
+    instance.load_forecast(data_forecasts)
+    if data_actual is not None:
+        instance.load_actual(data_actual)
+    for m in instance.day.machines:
+        m.fake_solution()
+    for (j, task) in enumerate(instance.day.tasks):
+        task.load_solution(task.taskid, data['machines']['m'][sched.machine[j]], sched.start[j])
+    instance.solutionread = True
+
+    if verbose >= 1 and sched.nr_unplaced > 0:
+        print "Heuristic: %i tasks did not fit on any machine"%sched.nr_unplaced
+    instance.verify()
+    errstr = instance.geterrorstring()
+    if errstr:
+        print "Error: Error trying to verify the instance: '%s'"%(errstr)
+        print >> sys.stderr, errstr
+        return None
+    return instance
+
+def schedule_instance(file_instance, data_forecasts, data_actual=None, verbose=0):
+    # same role as mzn_run() + mzn_toInstance() in mzn-runcheck.py
+    # returns (timing, checker Instance or None when not verified)
+    time_start = time.time()
+    data = instance_data.read_instance(file_instance)
+    sched = schedule(data, data_forecasts)
+    timing = (time.time() - time_start)
+    instance = schedule_to_instance(file_instance, data, sched, data_forecasts,
+                                    data_actual=data_actual, verbose=verbose)
+    return (timing, instance)
+
+
+if __name__ == '__main__':
+    import forecast2dzn as f2dzn
+    import checker_mzn as chkmzn
+
+    if len(sys.argv) < 3 or '-h' in sys.argv or '--help' in sys.argv:
+        print "%s instance.txt forecast.txt"%sys.argv[0]
+        sys.exit(0)
+
+    f = sys.argv[1]
+    data_forecasts = f2dzn.read_forecast(sys.argv[2])
+    data_forecasts = f2dzn.rescale(instance_data.read_instance(f)['time_step'], data_forecasts)
+    (timing, instance) = schedule_instance(f, data_forecasts, verbose=1)
+    if instance:
+        chkmzn.print_instance_csv(f, sys.argv[2], instance, timing=timing)
@@ -4,6 +4,8 @@
 
 import sys
 import os
+import instance_data
+import presolve
 
 def get_int(fin):
     return int(fin.readline())
@@ -32,50 +34,21 @@ def get_ints(fin, n):
 def mean(arr):
     return sum(arr)/len(arr)
 
-def read_machines(nr_mach, nr_res, fin):
-        ret = []
-        for mach in range(0,nr_mach):
-            data = dict()
-            (data['m'], data['idle'], data['up'], data['down']) = get_arr(fin, [int,float,float,float])
-            data['res'] = get_ints(fin, nr_res)
-
-            if mach != data['m']:
-                raise Exception("Machine %i does not match '%i'"%(mach, data['m']))
-            #print "Machine: ",mach,
-            #print data
-            ret.append(data)
-        return ret
-
-def read_tasks(nr_task, nr_res, fin):
-        ret = []
-        for task in range(0,nr_task):
-            data = dict()
-            (data['j'], data['dur'], data['earl'], data['late'], data['power']) = get_arr(fin, [int,int,int,int,float])
-            data['usage'] = get_ints(fin, nr_res)
-            
-            if task != data['j']:
-                raise Exception("Task %i does not match '%i'"%(task, data['j']))
-            #print "Task: ",task,
-            #print data
-            ret.append(data)
-        return ret
-
 def read_instance(infile):
+    # parsed (once per process) by the shared reader, returns a copy as
+    # dicts per machine and task that make_offset1() may modify
+    # (get_instance_dzn() works on the shared arrays without this copy)
+    arrs = instance_data.read_instance(infile)
     data = dict()
-    with open(infile, 'r') as fin:
-        data['time_step'] = get_int(fin)
-        data['nr_res'] = get_int(fin)
-        nr_mach = get_int(fin)
-
-        #for (key, value) in data.iteritems():
-        #    print "%s: %s"%(key,value)
+    data['time_step'] = arrs['time_step']
+    data['nr_res'] = arrs['nr_res']
 
-        #print "Reading %i machines..."%nr_mach
-        data['machines'] = read_machines(nr_mach, data['nr_res'], fin)
-
-        nr_task = get_int(fin)
-        #print "Reading %i tasks..."%nr_task
-        data['tasks'] = read_tasks(nr_task, data['nr_res'], fin)
+    mach = arrs['machines']
+    data['machines'] = [{'m': m, 'idle': idle, 'up': up, 'down': down, 'res': res}
+                        for (m, idle, up, down, res) in zip(mach['m'].tolist(), mach['idle'].tolist(), mach['up'].tolist(), mach['down'].tolist(), mach['res'].tolist())]
+    task = arrs['tasks']
+    data['tasks'] = [{'j': j, 'dur': dur, 'earl': earl, 'late': late, 'power': power, 'usage': usage}
+                     for (j, dur, earl, late, power, usage) in zip(task['j'].tolist(), task['dur'].tolist(), task['earl'].tolist(), task['late'].tolist(), task['power'].tolist(), task['usage'].tolist())]
 
     return data
 
@@ -101,53 +74,69 @@ def make_offset1(data):
         task['late'] += 1
 
 
-def get_dzn(data):
-    out = ""
-    out += "time_step = %(time_step)i;\n"%data
-    out += "nbMachines = %i;\n"%len(data['machines'])
-    out += "nbTasks = %i;\n"%len(data['tasks'])
-    out += "nbRes = %(nr_res)i;\n"%data
-
-    def subarr(arr, key):
-        return [str(x[key]) for x in arr]
-    def dzn2darr(arr, key):
-        data = [x[key] for x in arr]
-        ret = "array2d(1..%i, 1..%i, [\n"%(len(data),len(data[0]))
-
-        rows = [",".join(map(str,d)) for d in data]
-        ret += "\t"+",\n\t".join(rows)
-        ret += "\n])"
-        return ret
-
+def _dzn(time_step, nr_res, m_res, earl, late, dur, power, j_res):
+    # the arrays are (nested) python lists or numpy arrays, built as one
+    # list of parts; numpy values are only turned into python numbers to
+    # print them (str() of a python float)
+    def values(arr):
+        return arr.tolist() if hasattr(arr, 'tolist') else arr
+    def dzn2darr(rows):
+        rows = values(rows)
+        return "array2d(1..%i, 1..%i, [\n\t%s\n])"%(len(rows), len(rows[0]), ",\n\t".join(",".join(map(str,r)) for r in rows))
+
+    out = ["time_step = %i;\n"%time_step,
+           "nbMachines = %i;\n"%len(m_res),
+           "nbTasks = %i;\n"%len(dur),
+           "nbRes = %i;\n"%nr_res]
     # Machines
     #for x in ('up', 'idle', 'down'): # ignored for capita
-    #    out += "m_%s = [%s];\n"%(x, ",".join(subarr(data['machines'],x)))
-    out += "m_res = %s;\n"%dzn2darr(data['machines'], 'res')
-
+    #    out.append("m_%s = [%s];\n"%(x, ",".join(map(str,m_x))))
+    out.append("m_res = %s;\n"%dzn2darr(m_res))
     # Tasks
-    for x in ('earl', 'late', 'dur', 'power'):
-        out += "j_%s = [%s];\n"%(x, ",".join(subarr(data['tasks'],x)))
-    out += "j_res = %s;\n"%dzn2darr(data['tasks'], 'usage')
+    for (x, arr) in (('earl', earl), ('late', late), ('dur', dur), ('power', power)):
+        out.append("j_%s = [%s];\n"%(x, ",".join(map(str,values(arr)))))
+    out.append("j_res = %s;\n"%dzn2darr(j_res))
+    return "".join(out)
 
-    return out
+def get_dzn(data):
+    def subarr(arr, key):
+        return [x[key] for x in arr]
+    tasks = data['tasks']
+    return _dzn(data['time_step'], data['nr_res'],
+                subarr(data['machines'], 'res'),
+                subarr(tasks, 'earl'), subarr(tasks, 'late'),
+                subarr(tasks, 'dur'), subarr(tasks, 'power'),
+                subarr(tasks, 'usage'))
+
+def get_instance_dzn(infile):
+    # same as get_dzn() after read_instance() and make_offset1(), straight
+    # from the (memory-mapped) arrays of the shared reader
+    arrs = instance_data.read_instance(infile)
+    tasks = arrs['tasks']
+    return _dzn(arrs['time_step'], arrs['nr_res'],
+                arrs['machines']['res'],
+                tasks['earl']+1, tasks['late']+1,
+                tasks['dur'], tasks['power'], tasks['usage'])
 
 
 
 if __name__ == '__main__':
 
     if len(sys.argv) < 1 or '-h' in sys.argv or '--help' in sys.argv:
-        print "%s instance.txt [instance.dzn]"%sys.argv[0]
+        print "%s [--presolve] instance.txt [instance.dzn]"%sys.argv[0]
+        print "--presolve: also write the feasible start times and machines of every task, see presolve.py"
         sys.exit(0)
 
-    infile = sys.argv[1]
+    do_presolve = '--presolve' in sys.argv
+    args = [a for a in sys.argv[1:] if a != '--presolve']
+    infile = args[0]
     outfile = "%s.dzn"%os.path.splitext(os.path.basename(infile))[0]
 
-    data = read_instance(infile)
-    #print_data(data)
-
-    make_offset1(data)
-
-    dzn = get_dzn(data)
+    dzn = get_instance_dzn(infile)
+    if do_presolve:
+        pre = presolve.presolve(instance_data.read_instance(infile))
+        print presolve.format_stats(pre)
+        dzn += presolve.get_presolve_dzn(pre)
     with open(outfile, 'w') as fout:
         fout.write(dzn)
     print "Output written to:", outfile
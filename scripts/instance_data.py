@@ -0,0 +1,223 @@
+#!/usr/bin/env python
+# fast reader for icon challenge instance files (instance.txt, load*/day*.txt)
+# shared by checker.py and instance2dzn.py, every file is parsed once per
+# process and returned as read-only numpy arrays (offset 0, as in the file)
+#
+# the day*.txt files of a load directory are compiled into one binary store
+# 'instances.npy' in that directory, which is memory-mapped and sliced
+# without copying; it is rebuilt when the names, mtimes or sizes of the
+# day*.txt files no longer match the signature stored in it
+
+import os
+import glob
+import fnmatch
+import zlib
+import numpy as np
+
+STORENAME = 'instances.npy'
+STOREVERSION = 1
+DAYPATTERN = 'day*.txt'
+
+_cache = dict() # abspath -> (mtime, size, data)
+_stores = dict() # abspath of load dir -> (signature, {abspath: data}, {abspath: (mtime, size)})
+
+
+def parse_instance(text):
+    # tokenize the whole file at once, all values fit exactly in a float
+    tokens = np.array(text.split(), dtype=float)
+    if len(tokens) < 3:
+        raise Exception("Instance header is incomplete: '%s'"%text[:100])
+    (time_step, nr_res, nr_mach) = tokens[:3].astype(int)
+
+    m_width = 4 + nr_res
+    m_end = 3 + nr_mach*m_width
+    if len(tokens) <= m_end:
+        raise Exception("Instance with %i machines is truncated"%nr_mach)
+    nr_task = int(tokens[m_end])
+    t_width = 5 + nr_res
+    expected = m_end + 1 + nr_task*t_width
+    if len(tokens) != expected:
+        raise Exception("Token count (%i) does not match header (%i): %i machines, %i tasks, %i resources"%(len(tokens), expected, nr_mach, nr_task, nr_res))
+
+    mach = tokens[3:m_end].reshape(nr_mach, m_width)
+    task = tokens[m_end+1:].reshape(nr_task, t_width)
+    machines = {'m': mach[:,0].astype(int),
+                'idle': mach[:,1], 'up': mach[:,2], 'down': mach[:,3],
+                'res': mach[:,4:].astype(int)}
+    tasks = {'j': task[:,0].astype(int),
+             'dur': task[:,1].astype(int),
+             'earl': task[:,2].astype(int),
+             'late': task[:,3].astype(int),
+             'power': task[:,4],
+             'usage': task[:,5:].astype(int)}
+
+    if (machines['m'] != np.arange(nr_mach)).any():
+        m = np.flatnonzero(machines['m'] != np.arange(nr_mach))[0]
+        raise Exception("Machine %i does not match '%i'"%(m, machines['m'][m]))
+    if (tasks['j'] != np.arange(nr_task)).any():
+        j = np.flatnonzero(tasks['j'] != np.arange(nr_task))[0]
+        raise Exception("Task %i does not match '%i'"%(j, tasks['j'][j]))
+
+    for arr in machines.values() + tasks.values():
+        arr.flags.writeable = False # shared between all users of the file
+    return {'time_step': int(time_step), 'nr_res': int(nr_res),
+            'machines': machines, 'tasks': tasks}
+
+
+def _stats(files):
+    return dict((f, (st.st_mtime, st.st_size)) for (f, st) in ((f, os.stat(f)) for f in files))
+
+
+def _signature(files, stats):
+    # crc32 of the names, mtimes and sizes of the files
+    parts = []
+    for f in files:
+        (mtime, size) = stats[f]
+        parts.append("%s:%r:%i"%(os.path.basename(f), mtime, size))
+    return zlib.crc32(";".join(parts)) & 0xffffffff
+
+
+def _floatbits(arr):
+    # store floats bit-exact in the int64 store, see _floats()
+    return np.ascontiguousarray(arr, dtype=np.float64).view(np.int64)
+
+
+def _floats(arr):
+    return arr.view(np.float64)
+
+
+def build_store(files, signature):
+    # one int64 matrix, rows of width max(6, 5+nr_res):
+    #   row 0: version, number of days, signature
+    #   one row per day: time_step, nr_res, m_off, nr_mach, t_off, nr_task
+    #   machine rows: m, idle, up, down, res...   (idle/up/down float bits)
+    #   task rows: j, dur, earl, late, power, usage...   (power float bits)
+    datas = []
+    for f in files:
+        with open(f, 'r') as fin:
+            datas.append(parse_instance(fin.read()))
+    width = max([6] + [5+d['nr_res'] for d in datas])
+    nr_rows = 1 + len(datas) + sum(len(d['machines']['m'])+len(d['tasks']['j']) for d in datas)
+    rows = np.zeros((nr_rows, width), dtype=np.int64)
+    rows[0,:3] = (STOREVERSION, len(datas), signature)
+
+    off = 1 + len(datas)
+    for (i, d) in enumerate(datas):
+        (mach, task, nr_res) = (d['machines'], d['tasks'], d['nr_res'])
+        (nr_mach, nr_task) = (len(mach['m']), len(task['j']))
+        rows[1+i,:6] = (d['time_step'], nr_res, off, nr_mach, off+nr_mach, nr_task)
+
+        block = rows[off:off+nr_mach]
+        block[:,0] = mach['m']
+        block[:,1:4] = _floatbits(np.column_stack((mach['idle'], mach['up'], mach['down'])))
+        block[:,4:4+nr_res] = mach['res']
+        off += nr_mach
+
+        block = rows[off:off+nr_task]
+        block[:,0] = task['j']
+        block[:,1] = task['dur']
+        block[:,2] = task['earl']
+        block[:,3] = task['late']
+        block[:,4] = _floatbits(task['power'])
+        block[:,5:5+nr_res] = task['usage']
+        off += nr_task
+    return rows
+
+
+def _slice_day(rows, i):
+    # zero-copy views on day i of the store
+    (time_step, nr_res, m_off, nr_mach, t_off, nr_task) = rows[1+i,:6].tolist()
+    mach = rows[m_off:m_off+nr_mach]
+    task = rows[t_off:t_off+nr_task]
+    machines = {'m': mach[:,0],
+                'idle': _floats(mach[:,1]), 'up': _floats(mach[:,2]), 'down': _floats(mach[:,3]),
+                'res': mach[:,4:4+nr_res]}
+    tasks = {'j': task[:,0],
+             'dur': task[:,1],
+             'earl': task[:,2],
+             'late': task[:,3],
+             'power': _floats(task[:,4]),
+             'usage': task[:,5:5+nr_res]}
+    return {'time_step': time_step, 'nr_res': nr_res,
+            'machines': machines, 'tasks': tasks}
+
+
+def read_load(loaddir):
+    # all day*.txt instances of a load directory, through its binary store
+    # returns [(abspath, data)] sorted on filename
+    loaddir = os.path.abspath(loaddir)
+    files = sorted(glob.glob(os.path.join(loaddir, DAYPATTERN)))
+    if not files:
+        return []
+    stats = _stats(files)
+    signature = _signature(files, stats)
+    if loaddir in _stores and _stores[loaddir][0] == signature:
+        days = _stores[loaddir][1]
+        return [(f, days[f]) for f in files]
+
+    storefile = os.path.join(loaddir, STORENAME)
+    rows = None
+    if os.path.isfile(storefile):
+        try:
+            rows = np.load(storefile, mmap_mode='r')
+            if rows[0,:3].tolist() != [STOREVERSION, len(files), signature]:
+                rows = None # stale
+        except (IOError, ValueError):
+            rows = None
+    if rows is None:
+        rows = build_store(files, signature)
+        try:
+            tmpfile = storefile + '.%i.tmp'%os.getpid()
+            with open(tmpfile, 'wb') as fout:
+                np.save(fout, rows)
+            os.rename(tmpfile, storefile)
+        except (IOError, OSError):
+            pass # read-only load dir, use the in-memory store
+        rows.flags.writeable = False
+
+    days = dict((f, _slice_day(rows, i)) for (i, f) in enumerate(files))
+    _stores[loaddir] = (signature, days, stats)
+    return [(f, days[f]) for f in files]
+
+
+def read_instance(infile):
+    # cached on path and modification time, do not modify the arrays
+    path = os.path.abspath(infile)
+    if fnmatch.fnmatch(os.path.basename(path), DAYPATTERN):
+        # a day of a store already read: only stat that file, no glob
+        store = _stores.get(os.path.dirname(path))
+        if store and path in store[2]:
+            st = os.stat(path)
+            if store[2][path] == (st.st_mtime, st.st_size):
+                return store[1][path]
+        for (f, data) in read_load(os.path.dirname(path)):
+            if f == path:
+                return data
+
+    st = os.stat(path)
+    if path in _cache:
+        (mtime, size, data) = _cache[path]
+        if (mtime, size) == (st.st_mtime, st.st_size):
+            return data
+
+    with open(path, 'r') as fin:
+        data = parse_instance(fin.read())
+    _cache[path] = (st.st_mtime, st.st_size, data)
+    return data
+
+
+if __name__ == '__main__':
+    import sys
+    if len(sys.argv) < 2 or '-h' in sys.argv or '--help' in sys.argv:
+        print "%s instance.txt|loaddir [instance.txt|loaddir ...]"%sys.argv[0]
+        print "Prints a summary, for load directories (re)builds their '%s'"%STORENAME
+        sys.exit(0)
+
+    for arg in sys.argv[1:]:
+        if os.path.isdir(arg):
+            for (infile, data) in read_load(arg):
+                print "%s: time_step %i, %i resources, %i machines, %i tasks"%(infile, data['time_step'], data['nr_res'], len(data['machines']['m']), len(data['tasks']['j']))
+            continue
+        infile = arg
+        data = read_instance(infile)
+        print "%s: time_step %i, %i resources, %i machines, %i tasks"%(infile, data['time_step'], data['nr_res'], len(data['machines']['m']), len(data['tasks']['j']))
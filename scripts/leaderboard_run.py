@@ -26,16 +26,31 @@ if __name__ == '__main__':
     parser = argparse.ArgumentParser(description="Run and check a MZN model in ICON challenge data")
     parser.add_argument("file_mzn")
     parser.add_argument("--out", help="file to write the JSON output to", default="out.json")
-    parser.add_argument("--mzn-solver", help="the mzn solver to use (mzn-g12mip or mzn-gecode for example)", default='mzn-g12mip')
+    parser.add_argument("--mzn-solver", help="the mzn solver to use (mzn-g12mip or mzn-gecode for example), a comma separated list races the solvers as a portfolio", default='mzn-g12mip')
+    parser.add_argument("--runtime-log", help="file to append the runtime and instance features of every solver run to (for --select and scripts/solver_select.py)")
+    parser.add_argument("--select", help="runtime log to train on, picks the model and solver expected to be fastest per instance (overrides file_mzn and --mzn-solver)")
+    parser.add_argument("--portfolio-log", help="file to append the winner of every portfolio race to, the win rates per load in it are printed at the end")
     parser.add_argument("--mzn-dir", help="optionally, if the binaries are not on your PATH, set this to the directory of the MiniZinc IDE", default="")
     parser.add_argument("--tmp", help="temp directory (default = automatically generated)")
+    parser.add_argument("--presolve", help="add the feasible start times and machines of every task to the dzn (the model has to declare j_starts, j_mach and m_usable, see scripts/presolve.py)", action="store_true")
+    parser.add_argument("--multires", help="solve on a time grid this many times coarser first, then at full resolution around the coarse starts (implies the --presolve model declarations, see scripts/multires.py)", type=int)
+    parser.add_argument("--multires-radius", help="number of time periods a task may start from its coarse start (default = the --multires factor)", type=int)
+    parser.add_argument("--fast-path", help="skip the solver when every task at its own cheapest start fits on the machines (optimal for the task costs)", action="store_true")
+    parser.add_argument("--inline-dzn", help="pass the dzn data on the solver command line (-D) instead of through files in a temp directory", action="store_true")
+    parser.add_argument("-t", "--time-limit", help="stop the solver after this many seconds and keep its best solution so far", type=float)
+    parser.add_argument("--cache", help="directory of the solution cache, solves of the same model, instance, forecast and solver are not repeated (default = no cache)")
+    parser.add_argument("--cache-size", help="maximum size of the solution cache in MB", type=float, default=100)
+    parser.add_argument("-j", "--jobs", help="number of instances to solve in parallel (0 = number of cpus)", type=int, default=1)
     parser.add_argument("-c", "--historic-days", help="How many historic days to learn from", default=30, type=int)
+    parser.add_argument("--heuristic", help="schedule with the native heuristic (scripts/heuristic.py) instead of MiniZinc", action="store_true")
     # debugging options:
     parser.add_argument("-p", "--print-pretty", help="pretty print the machines and tasks", action="store_true")
     parser.add_argument("-v", help="verbosity (0,1,2 or 3)", type=int, default=0)
     parser.add_argument("--print-output", help="print the output of minizinc", action="store_true")
     parser.add_argument("--tmp-keep", help="keep created temp subdir", action="store_true")
     args = parser.parse_args()
+    if args.multires and ',' in args.mzn_solver:
+        parser.error("--multires does not combine with a portfolio of solvers")
 
     dir_load = '../'
     datafile = '../data/prices2013.dat';
@@ -84,12 +99,17 @@ if __name__ == '__main__':
             for (f_inst, day, instance) in run_triples:
                 # TODO: check order of f_inst and subsequent days
                 f_name = os.path.basename(f_inst)
+                if instance is None:
+                    print "Warning: no solution for '%s' from %s, left out of the output and the total"%(f_inst, day_str)
+                    continue
                 res[load][day_str][f_name] = instance2arr(instance)
                 
 
             # compute total actual cost (and time)
             tot_act = 0
             for (f_inst, dayx, instance) in run_triples:
+                if instance is None:
+                    continue
                 instance.compute_costs()
                 tot_act += instance.day.cj_act
             print "%s from %s, linear: total actual cost: %.1f (runtime: %.2f)"%(load, day_str, tot_act, runtime)
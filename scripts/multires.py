@@ -0,0 +1,59 @@
+#!/usr/bin/env python
+# multi-resolution solving: solve on a coarse time grid first, then solve
+# the full instance with every task's start restricted to a neighbourhood of
+# its coarse start (see mzn_multires() in mzn-runcheck.py)
+#
+# coarsening by a factor k: time_step*k, windows rounded outwards
+# (est/k down, let/k up) and durations up, so every task keeps a start;
+# the prices are aggregated as forecast2dzn.rescale() does. A coarse start
+# s' is fine start s'*k, the fine solve may use s'*k-radius .. s'*k+radius
+# within the original window of the task.
+
+import numpy as np
+
+import instance_data
+
+
+def coarsen(data, factor):
+    # data: from instance_data.read_instance(), returns the same structure
+    nr_periods = (24*60) // data['time_step']
+    if nr_periods % factor != 0:
+        raise Exception("%i time periods can not be coarsened by a factor %i"%(nr_periods, factor))
+    tasks = data['tasks']
+    coarse = dict(tasks)
+    coarse['earl'] = tasks['earl'] // factor
+    coarse['late'] = -(-tasks['late'] // factor)
+    coarse['dur'] = -(-tasks['dur'] // factor)
+    return {'time_step': data['time_step']*factor, 'nr_res': data['nr_res'],
+            'machines': data['machines'], 'tasks': coarse}
+
+
+def format_instance(data):
+    # the text of an instance file for data, as read by parse_instance()
+    mach = data['machines']
+    tasks = data['tasks']
+    out = ["%i"%data['time_step'], "%i"%data['nr_res'], "%i"%len(mach['m'])]
+    for i in xrange(len(mach['m'])):
+        out.append("%i %r %r %r"%(mach['m'][i], mach['idle'][i], mach['up'][i], mach['down'][i]))
+        out.append(" ".join(map(str, mach['res'][i].tolist())))
+    out.append("%i"%len(tasks['j']))
+    for j in xrange(len(tasks['j'])):
+        out.append("%i %i %i %i %r"%(tasks['j'][j], tasks['dur'][j], tasks['earl'][j], tasks['late'][j], tasks['power'][j]))
+        out.append(" ".join(map(str, tasks['usage'][j].tolist())))
+    return "\n".join(out) + "\n"
+
+
+def write_instance(data, path):
+    with open(path, 'w') as fout:
+        fout.write(format_instance(data))
+
+
+def neighbourhood(data, coarse_start, factor, radius):
+    # (first, last) fine start times per task (offset 0), for presolve
+    tasks = data['tasks']
+    lo = tasks['earl']
+    hi = tasks['late'] - tasks['dur']
+    centre = np.clip(np.asarray(coarse_start)*factor, lo, hi)
+    first = np.maximum(centre - radius, lo)
+    last = np.minimum(centre + radius, hi)
+    return (first, last)
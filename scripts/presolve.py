@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+# presolve of an icon challenge instance, before the dzn export
+#
+# - the feasible start times of every task: est..let-dur
+# - which machines can host which task: its use of every resource fits in
+#   the capacity of the machine (eligibility matrix)
+# - machines that can host no task at all
+# - trivially infeasible instances: a task without start time or machine,
+#   more resource use x duration than all machines can provide over the
+#   day, or compulsory parts (the periods a task runs whatever its start)
+#   that need more than the total capacity in some period
+#
+# get_presolve_dzn() writes the sets and the matrix (offset 1) as
+#     array[Tasks] of set of int: j_starts;
+#     array[Tasks,Machines] of bool: j_mach;
+#     set of int: m_usable;
+# so a model can restrict x[j,m,t] to m in j_mach[j,..] and t in j_starts[j]
+
+import sys
+import numpy as np
+
+import instance_data
+
+
+def presolve(data, windows=None):
+    # data: from instance_data.read_instance(), results are offset 0
+    # windows: optional (first, last) start times per task to restrict the
+    # start times to (see multires.py)
+    tasks = data['tasks']
+    cap = data['machines']['res']
+    (dur, use) = (tasks['dur'], tasks['usage'])
+    nr_periods = (24*60) // data['time_step']
+
+    first = tasks['earl']
+    last = np.minimum(tasks['late'], nr_periods) - dur
+    if windows is not None:
+        first = np.maximum(first, windows[0])
+        last = np.minimum(last, windows[1])
+    nr_starts = np.maximum(last - first + 1, 0)
+    eligible = (use[:,np.newaxis,:] <= cap[np.newaxis,:,:]).all(axis=2)
+    usable = eligible.any(axis=0)
+
+    infeasible = []
+    for j in np.flatnonzero(nr_starts == 0):
+        infeasible.append("Task %i has no start time in its window"%j)
+    for j in np.flatnonzero(~eligible.any(axis=1)):
+        infeasible.append("Task %i fits on no machine"%j)
+
+    total = cap[usable].sum(axis=0)
+    work = (use * dur[:,np.newaxis]).sum(axis=0)
+    for r in np.flatnonzero(work > total*nr_periods):
+        infeasible.append("Resource %i: tasks need %i, machines provide %i over the day"%(r, work[r], total[r]*nr_periods))
+
+    # compulsory part of task j: periods last_j .. first_j+dur_j-1
+    compulsory = np.zeros((nr_periods+1, use.shape[1]), dtype=int)
+    has = (last < first + dur) & (nr_starts > 0)
+    np.add.at(compulsory, last[has], use[has])
+    np.add.at(compulsory, (first+dur)[has], -use[has])
+    compulsory = np.cumsum(compulsory[:-1], axis=0)
+    for (t, r) in zip(*np.nonzero(compulsory > total)):
+        infeasible.append("Resource %i: compulsory use %i exceeds total capacity %i in time period %i"%(r, compulsory[t,r], total[r], t))
+
+    nr_mach = eligible.sum(axis=1)
+    stats = {'nr_tasks': len(dur), 'nr_machines': cap.shape[0],
+             'nr_usable': int(usable.sum()), 'nr_periods': nr_periods,
+             'vars_full': len(dur)*cap.shape[0]*nr_periods,
+             'vars_reduced': int((nr_starts * nr_mach).sum())}
+    return {'first': first, 'last': last, 'eligible': eligible,
+            'usable': usable, 'infeasible': infeasible, 'stats': stats}
+
+
+def get_presolve_dzn(pre):
+    starts = []
+    for (f, l) in zip(pre['first'].tolist(), pre['last'].tolist()):
+        if l < f:
+            starts.append("{}")
+        else:
+            starts.append("%i..%i"%(f+1, l+1))
+    eligible = pre['eligible']
+    out = ["j_starts = [%s];\n"%",".join(starts),
+           "j_mach = array2d(1..%i, 1..%i, [\n\t%s\n]);\n"%(eligible.shape[0], eligible.shape[1], ",\n\t".join(",".join(["false","true"][e] for e in row) for row in eligible.tolist())),
+           "m_usable = {%s};\n"%",".join(str(m+1) for m in np.flatnonzero(pre['usable']))]
+    return "".join(out)
+
+
+def format_stats(pre):
+    s = pre['stats']
+    msg = "Presolve: %i tasks, %i of %i machines usable, x variables %i -> %i (%.1f%%)"%(s['nr_tasks'], s['nr_usable'], s['nr_machines'], s['vars_full'], s['vars_reduced'], 100.0*s['vars_reduced']/max(s['vars_full'],1))
+    if pre['infeasible']:
+        msg += ", infeasible: %s"%"; ".join(pre['infeasible'])
+    return msg
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2 or '-h' in sys.argv or '--help' in sys.argv:
+        print "%s instance.txt [instance.txt ...]"%sys.argv[0]
+        sys.exit(0)
+
+    for infile in sys.argv[1:]:
+        pre = presolve(instance_data.read_instance(infile))
+        print "%s: %s"%(infile, format_stats(pre))
@@ -0,0 +1,187 @@
+#!/usr/bin/env python
+# walk-forward backtest of price forecasters over a range of days
+#
+# every model predicts every day's SMPEP2 (one day ahead) after fitting on
+# the historic_days before it; the (model, month) pairs are spread over a
+# process pool. The workers get the feature data (price_features.Features
+# of the memory-mapped price columns) once, through the pool initializer:
+# inherited read-only on fork, not copied per task
+#
+# a model is a (name, factory) pair, factory() returns an object with
+# fit(X, y) and predict(X) (sklearn style); models with add(X, y)
+# (sliding_regression.SlidingRegression) are updated day by day instead of
+# refitted
+# reports the MSE and MAE per model, per month and per period of the day,
+# headless (no plotting)
+
+import sys
+import argparse
+import multiprocessing
+import time as ttime
+from datetime import *
+import numpy as np
+
+import prices_data
+from price_features import Features
+from sliding_regression import SlidingRegression, walk_forward
+
+COLUMN_FEATURES = [ 'HolidayFlag', 'DayOfWeek', 'PeriodOfDay', 'ForecastWindProduction', 'SystemLoadEA', 'SMPEA' ] # within the same day you can use all except: ActualWindProduction, SystemLoadEP2, SMPEP2
+COLUMN_PREDICT = 'SMPEP2'
+
+
+def _linear():
+    from sklearn import linear_model
+    return linear_model.LinearRegression()
+
+def _ridge():
+    from sklearn import linear_model
+    return linear_model.Ridge(alpha=1.0)
+
+def _svr():
+    # as in prices_regress.py: scaled features
+    from sklearn import pipeline, preprocessing, svm
+    return pipeline.make_pipeline(preprocessing.StandardScaler(), svm.SVR(gamma='auto'))
+
+def _sliding():
+    return SlidingRegression()
+
+MODELS = [('lin', _linear), ('ridge', _ridge), ('svr', _svr), ('sliding', _sliding)]
+
+
+_worker = dict() # set by _init_worker(), in every worker process
+
+def _init_worker(feats, models, column, historic_days):
+    _worker.update(feats=feats, models=models, column=column,
+                   historic_days=historic_days)
+
+
+def _run(task):
+    # (model index, days) -> [(day, predictions, actuals, periods)]
+    (m, days) = task
+    (feats, column, hist) = (_worker['feats'], _worker['column'], _worker['historic_days'])
+    model = _worker['models'][m][1]()
+    one = timedelta(1)
+    out = []
+    if hasattr(model, 'add'):
+        model.window = hist
+        for (day, preds, actuals) in walk_forward(feats, column, days[0], days[-1] + one, model):
+            if day in days:
+                out.append((day, preds, np.array(actuals), feats.target('PeriodOfDay', day, day + one)))
+        return out
+    for day in days:
+        y = feats.target(column, day, day + one)
+        y_train = feats.target(column, day - timedelta(hist), day)
+        if len(y) == 0 or len(y_train) == 0:
+            continue
+        model.fit(feats.rows(day - timedelta(hist), day), y_train)
+        out.append((day, model.predict(feats.rows(day, day + one)), np.array(y),
+                    feats.target('PeriodOfDay', day, day + one)))
+    return out
+
+
+def backtest(feats, models, days, column=COLUMN_PREDICT, historic_days=30, processes=None):
+    # models: [(name, factory)], days: the days to predict
+    # processes: size of the pool (None = number of cpus, 1 = no pool)
+    # returns {name: [(day, predictions, actuals, periods)]} sorted on day
+    months = dict()
+    for day in sorted(days):
+        months.setdefault((day.year, day.month), []).append(day)
+    tasks = [(m, months[k]) for m in xrange(len(models)) for k in sorted(months)]
+
+    if processes == 1:
+        _init_worker(feats, models, column, historic_days)
+        results = map(_run, tasks)
+    else:
+        pool = multiprocessing.Pool(processes, initializer=_init_worker,
+                                    initargs=(feats, models, column, historic_days))
+        try:
+            results = pool.map(_run, tasks, chunksize=1)
+        finally:
+            pool.terminate()
+            pool.join()
+
+    res = dict((name, []) for (name, factory) in models)
+    for ((m, ds), out) in zip(tasks, results):
+        res[models[m][0]].extend(out)
+    return res
+
+
+def summarize(res):
+    # {name: {'all': (mse, mae), 'month': {(year, month): (mse, mae)},
+    #         'period': {period: (mse, mae)}}}
+    def scores(err):
+        return (float(np.mean(err**2)), float(np.mean(np.abs(err))))
+    summary = dict()
+    for (name, out) in res.iteritems():
+        if not out:
+            continue
+        err = np.concatenate([preds - actuals for (day, preds, actuals, periods) in out])
+        months = np.concatenate([[day.year*100 + day.month]*len(actuals) for (day, preds, actuals, periods) in out])
+        periods = np.concatenate([periods for (day, preds, actuals, periods) in out])
+        summary[name] = {'all': scores(err),
+                         'month': dict(((k // 100, k % 100), scores(err[months == k])) for k in np.unique(months)),
+                         'period': dict((int(p), scores(err[periods == p])) for p in np.unique(periods))}
+    return summary
+
+
+def print_summary(summary, days):
+    names = sorted(summary, key=lambda name: summary[name]['all'][0])
+    print "Backtest over %i days, %s to %s"%(len(days), min(days), max(days))
+    print "%-10s %12s %12s"%("model", "MSE", "MAE")
+    for name in names:
+        print "%-10s %12.3f %12.3f"%((name,) + summary[name]['all'])
+
+    for (key, label, fmt) in (('month', "month", lambda k: "%04i-%02i"%k),
+                              ('period', "period", lambda k: "%i"%k)):
+        keys = sorted(set(k for name in names for k in summary[name][key]))
+        print
+        print "MSE / MAE per %s"%label
+        print "%-8s "%label + " ".join("%21s"%name for name in names)
+        for k in keys:
+            cells = []
+            for name in names:
+                if k in summary[name][key]:
+                    cells.append("%10.3f %10.3f"%summary[name][key][k])
+                else:
+                    cells.append("%21s"%"-")
+            print "%-8s "%fmt(k) + " ".join(cells)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Walk-forward backtest of price forecasters on the price data")
+    parser.add_argument("datafile", help="price data, e.g. data/prices2013.dat")
+    parser.add_argument("-m", "--models", help="comma separated models to compare, out of %s (default = all)"%", ".join(name for (name, factory) in MODELS))
+    parser.add_argument("--first", help="first day to predict (YYYY-MM-DD, default = historic-days after the first day of the data)")
+    parser.add_argument("--last", help="last day to predict (YYYY-MM-DD, default = the last day of the data)")
+    parser.add_argument("-c", "--historic-days", help="How many historic days to learn from", default=30, type=int)
+    parser.add_argument("-f", "--features", help="comma separated features (see scripts/price_features.py)", default=",".join(COLUMN_FEATURES))
+    parser.add_argument("-j", "--jobs", help="number of processes (0 = number of cpus)", type=int, default=0)
+    args = parser.parse_args()
+
+    models = MODELS
+    if args.models:
+        byname = dict(MODELS)
+        for name in args.models.split(','):
+            if name not in byname:
+                parser.error("unknown model '%s'"%name)
+        models = [(name, byname[name]) for name in args.models.split(',')]
+
+    dat = prices_data.load_prices(args.datafile)
+    feats = Features(dat, args.features.split(','))
+    alldays = prices_data.get_all_days(dat)
+    first = alldays[0] + timedelta(args.historic_days)
+    last = alldays[-1]
+    if args.first:
+        first = datetime.strptime(args.first, '%Y-%m-%d').date()
+    if args.last:
+        last = datetime.strptime(args.last, '%Y-%m-%d').date()
+    days = [d for d in alldays if first <= d <= last]
+    if not days:
+        parser.error("no data between %s and %s"%(first, last))
+
+    time_start = ttime.time()
+    res = backtest(feats, models, days, historic_days=args.historic_days,
+                   processes=(args.jobs or None))
+    print_summary(summarize(res), days)
+    print
+    print "Runtime: %.2fs"%(ttime.time() - time_start)
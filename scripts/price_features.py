@@ -0,0 +1,130 @@
+#!/usr/bin/env python
+# feature matrices for the price forecasters, from a prices_data.PriceData
+#
+# Features(dat, names) computes every feature once for all rows of the data,
+# as one float matrix with a column per name in the order of 'names';
+# rows(first, last) is a view on the rows of the days first <= day < last
+# (through the date index of the PriceData), no per-row work or eval()
+# get_features(dat, names) builds them once per PriceData, for callers that
+# forecast from the same data many times (e.g. every start day of a run)
+#
+# a name is a column of the data, or a feature derived from a column:
+#     SMPEA_lag3      the value 3 rows (time periods) earlier
+#     SMPEA_prevday   the value at the same time of the previous day
+#     SMPEA_mean48    the mean of the last 48 rows, up to and including
+#                     this one (missing values left out)
+# missing values (NaN in the data, or before the start of it) are imputed
+# with impute='ffill' the last known value of the feature (the mean of the
+# feature before its first one), with 'mean' the mean of the feature, or
+# left NaN with impute=None
+
+import re
+import sys
+import numpy as np
+
+_DERIVED = re.compile(r'^(?P<col>.+)_(?:(?P<op>lag|mean)(?P<k>\d+)|(?P<prevday>prevday))$')
+
+
+def lag(x, k):
+    out = np.empty(len(x))
+    out[:k] = np.nan
+    out[k:] = x[:len(x)-k]
+    return out
+
+
+def rolling_mean(x, k):
+    valid = ~np.isnan(x)
+    sums = np.concatenate(([0.0], np.cumsum(np.where(valid, x, 0.0))))
+    counts = np.concatenate(([0], np.cumsum(valid)))
+    lo = np.maximum(np.arange(len(x)) + 1 - k, 0)
+    (s, n) = (sums[1:] - sums[lo], counts[1:] - counts[lo])
+    out = np.full(len(x), np.nan)
+    out[n > 0] = s[n > 0] / n[n > 0]
+    return out
+
+
+def prevday(times, x):
+    # times: sorted datetime64 of the rows
+    target = times - np.timedelta64(1, 'D')
+    idx = np.searchsorted(times, target)
+    found = idx < len(times)
+    found[found] = times[idx[found]] == target[found]
+    out = np.full(len(x), np.nan)
+    out[found] = x[idx[found]]
+    return out
+
+
+def impute(x, how='ffill'):
+    # x with its NaN values imputed (a copy when there are any)
+    missing = np.isnan(x)
+    if how is None or not missing.any() or missing.all():
+        return x
+    mean = x[~missing].mean()
+    if how == 'mean':
+        return np.where(missing, mean, x)
+    if how == 'ffill':
+        last = np.maximum.accumulate(np.where(missing, -1, np.arange(len(x))))
+        return np.where(last >= 0, x[np.maximum(last, 0)], mean)
+    raise Exception("Unknown imputation '%s', use 'ffill', 'mean' or None"%how)
+
+
+class Features(object):
+
+    def __init__(self, dat, names, impute_missing='ffill'):
+        # dat: PriceData (prices_data.load_prices()), names: see above
+        self.dat = dat
+        self.names = list(names)
+        X = np.empty((len(dat), len(self.names)))
+        for (i, name) in enumerate(self.names):
+            X[:,i] = impute(self.feature(name), impute_missing)
+        X.flags.writeable = False # rows() hands out views
+        self.X = X
+
+    def feature(self, name):
+        # the column of one feature for all rows, not imputed
+        if name in self.dat.columns:
+            return self.dat.column(name).astype(float)
+        m = _DERIVED.match(name)
+        if m is None or m.group('col') not in self.dat.columns:
+            raise Exception("Unknown feature '%s', not a column of the data nor COLUMN_lagK, COLUMN_meanK or COLUMN_prevday"%name)
+        x = self.dat.column(m.group('col')).astype(float)
+        if m.group('prevday'):
+            return prevday(self.dat.column('datetime'), x)
+        k = int(m.group('k'))
+        if m.group('op') == 'lag':
+            return lag(x, k)
+        if k < 1:
+            raise Exception("Feature '%s': the mean needs at least 1 row"%name)
+        return rolling_mean(x, k)
+
+    def rows(self, first, last):
+        # feature matrix (view) of the days first <= day < last
+        (a, b) = self.dat.span(first, last)
+        return self.X[a:b]
+
+    def target(self, column, first, last):
+        # values (view) of a column of the data on the same rows
+        (a, b) = self.dat.span(first, last)
+        return self.dat.column(column)[a:b]
+
+
+def get_features(dat, names, impute_missing='ffill'):
+    # Features(dat, names, impute_missing), kept in dat.feature_cache
+    key = (tuple(names), impute_missing)
+    if key not in dat.feature_cache:
+        dat.feature_cache[key] = Features(dat, names, impute_missing=impute_missing)
+    return dat.feature_cache[key]
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 3 or '-h' in sys.argv or '--help' in sys.argv:
+        print "%s prices.dat feature [feature ...]"%sys.argv[0]
+        print "Prints the mean, min, max and missing values of every feature"
+        sys.exit(0)
+
+    import prices_data
+    dat = prices_data.load_prices(sys.argv[1])
+    feats = Features(dat, sys.argv[2:], impute_missing=None)
+    for (i, name) in enumerate(feats.names):
+        x = feats.X[:,i]
+        print "%-30s mean %10.3f min %10.3f max %10.3f missing %i"%(name, np.nanmean(x), np.nanmin(x), np.nanmax(x), np.isnan(x).sum())
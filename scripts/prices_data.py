@@ -1,21 +1,223 @@
 #!/usr/bin/env python
+# price data (data/prices*.dat), one row per half hour
+#
+# load_price_columns() parses the space separated file once into one typed
+# numpy array per column: 'datetime' (datetime64[m], from '#DateTime'), the
+# integer calendar columns, 'Holiday' (bytes) and floats with NaN for the
+# missing values (ORKTemperature, ORKWindspeed, CO2Intensity)
+# the columns are cached in '<file>.npy' next to the .dat, which is
+# memory-mapped on later loads and rebuilt when the mtime or size of the
+# .dat no longer match the signature stored in it
+# the file is parsed in chunks of CHUNKROWS rows (iter_price_chunks()), so
+# multi-year files never exist as a list of rows
+#
+# load_prices() returns a PriceData, which iterates and indexes as the list
+# of csv.DictReader rows it used to be (string values plus 'datetime')
+#
+# a PriceData indexes its rows by date when it is built: get_data_day(),
+# get_data_days() and get_data_prevdays() return a PriceData of views on
+# the rows of those days (no scan, no copy), get_all_days() the indexed
+# dates; on a plain list of rows they still scan
 
+import os
 import random
 import csv
 import sys
+import zlib
+import itertools
+import numpy as np
 from datetime import *
 
+CACHEEXT = '.npy'
+CACHEVERSION = 1
+CHUNKROWS = 2**15
+DATECOLUMN = '#DateTime'
+INTCOLUMNS = ['HolidayFlag', 'DayOfWeek', 'WeekOfYear', 'Day', 'Month', 'Year', 'PeriodOfDay']
+STRCOLUMNS = ['Holiday']
+MISSING = ['', 'NaN', 'nan', 'NA']
+
+
+def _reader(fin):
+    return csv.reader(fin, delimiter=' ', quotechar='"', skipinitialspace=True)
+
+
+def _column(name, values):
+    # typed array of one column of string values
+    if name == DATECOLUMN:
+        # 'Fri 01/02/2013 00:30' -> '2013-02-01T00:30'
+        iso = ["%s-%s-%sT%s"%(v[10:14], v[7:9], v[4:6], v[15:20]) for v in values]
+        return np.array(iso, dtype='datetime64[m]')
+    if name in INTCOLUMNS:
+        return np.array(values, dtype=np.int64)
+    if name in STRCOLUMNS:
+        return np.array(values, dtype=bytes)
+    return np.array([np.nan if v in MISSING else float(v) for v in values])
+
+
+def _colname(name):
+    if name == DATECOLUMN:
+        return 'datetime'
+    return name
+
+
+def iter_price_chunks(filename, chunk_rows=CHUNKROWS):
+    # yields {column name: typed array} of every chunk_rows rows
+    with open(filename, 'r') as fin:
+        reader = _reader(fin)
+        names = reader.next()
+        while True:
+            rows = [row for row in itertools.islice(reader, chunk_rows) if row]
+            if not rows:
+                break
+            for row in rows:
+                if len(row) != len(names):
+                    raise Exception("%s: row with %i values, header has %i columns: %r"%(filename, len(row), len(names), row))
+            yield dict((_colname(name), _column(name, vals))
+                       for (name, vals) in zip(names, zip(*rows)))
+
+
+def _signature(filename):
+    st = os.stat(filename)
+    return zlib.crc32("%s:%r:%i"%(os.path.basename(filename), st.st_mtime, st.st_size)) & 0xffffffff
+
+
+def _header(filename):
+    with open(filename, 'r') as fin:
+        return [_colname(name) for name in _reader(fin).next()]
+
+
+def parse_price_columns(filename, chunk_rows=CHUNKROWS):
+    # {column name: typed array} of the whole file, without cache
+    names = _header(filename)
+    chunks = list(iter_price_chunks(filename, chunk_rows=chunk_rows))
+    if not chunks:
+        raise Exception("%s: no price data"%filename)
+    return dict((name, np.concatenate([c[name] for c in chunks])) for name in names)
+
+
+def _store(columns, names, signature):
+    # one record of fixed length arrays, every column contiguous in the file
+    n = len(columns[names[0]])
+    dtype = [('_version', np.int64), ('_signature', np.int64)] + \
+            [(name, columns[name].dtype, (n,)) for name in names]
+    rec = np.zeros(1, dtype=dtype)
+    rec['_version'] = CACHEVERSION
+    rec['_signature'] = signature
+    for name in names:
+        rec[name][0] = columns[name]
+    return rec
+
+
+def load_price_columns(filename, cache=True, chunk_rows=CHUNKROWS):
+    # PriceData of the file, through its binary cache unless cache=False
+    names = _header(filename)
+    if not cache:
+        return PriceData(parse_price_columns(filename, chunk_rows), names)
+
+    signature = _signature(filename)
+    cachefile = filename + CACHEEXT
+    rec = None
+    if os.path.isfile(cachefile):
+        try:
+            rec = np.load(cachefile, mmap_mode='r')
+            if (int(rec['_version'][0]), int(rec['_signature'][0])) != (CACHEVERSION, signature) or \
+               list(rec.dtype.names[2:]) != names:
+                rec = None # stale
+        except (IOError, ValueError):
+            rec = None
+    if rec is None:
+        rec = _store(parse_price_columns(filename, chunk_rows), names, signature)
+        try:
+            tmpfile = cachefile + '.%i.tmp'%os.getpid()
+            with open(tmpfile, 'wb') as fout:
+                np.save(fout, rec)
+            os.rename(tmpfile, cachefile)
+        except (IOError, OSError):
+            pass # read-only data dir, use the in-memory columns
+    return PriceData(dict((name, rec[name][0]) for name in names), names)
+
+
+class PriceData(object):
+    # typed columns with the row dict view of the old load_prices()
+
+    def __init__(self, columns, names):
+        # columns: {name: array}, names: in file order ('datetime' for
+        # '#DateTime')
+        self.columns = columns
+        self.names = names
+        self._rows = None # row dicts, built on the first iteration
+        self.feature_cache = dict() # see price_features.get_features()
+        dates = columns['datetime'].astype('datetime64[D]')
+        if (dates[1:] < dates[:-1]).any():
+            order = np.argsort(columns['datetime'], kind='mergesort')
+            columns = dict((name, arr[order]) for (name, arr) in columns.iteritems())
+            (self.columns, dates) = (columns, dates[order])
+        for arr in columns.values():
+            arr.flags.writeable = False # memory-mapped or shared with views
+        # date index: the rows of self.days[d] are starts[d]:starts[d+1]
+        starts = np.flatnonzero(dates[1:] != dates[:-1]) + 1
+        self.days = dates[np.concatenate(([0], starts))] if len(dates) else dates
+        self.starts = np.concatenate(([0], starts, [len(dates)]))
+
+    def __len__(self):
+        return len(self.columns[self.names[0]])
+
+    def column(self, name):
+        return self.columns[name]
+
+    def __getitem__(self, i):
+        # a row dict, or for a slice a PriceData of views on the columns
+        if isinstance(i, slice):
+            sub = PriceData(dict((name, arr[i]) for (name, arr) in self.columns.iteritems()), self.names)
+            if self._rows is not None:
+                sub._rows = self._rows[i]
+            return sub
+        if self._rows is not None:
+            return self._rows[i]
+        return self._row(dict((name, arr[i].item()) for (name, arr) in self.columns.iteritems()))
+
+    def __iter__(self):
+        if self._rows is None:
+            cols = dict((name, arr.tolist()) for (name, arr) in self.columns.iteritems())
+            self._rows = [self._row(dict((name, col[i]) for (name, col) in cols.iteritems()))
+                          for i in xrange(len(self))]
+        return iter(self._rows)
+
+    def all_days(self):
+        return self.days.astype(date).tolist()
+
+    def span(self, first, last):
+        # (start, end) row range of the days first <= day < last
+        (a, b) = np.searchsorted(self.days, np.array([first, last], dtype='datetime64[D]'))
+        return (self.starts[a], self.starts[b])
+
+    def between(self, first, last):
+        # PriceData of the rows of the days first <= day < last
+        (a, b) = self.span(first, last)
+        return self[a:b]
+
+    def _row(self, values):
+        # the csv.DictReader row: every value as a string, plus 'datetime'
+        # values: {name: python value} of one row
+        row = dict()
+        for name in self.names:
+            v = values[name]
+            if name == 'datetime':
+                row['datetime'] = v
+                row[DATECOLUMN] = v.strftime('%a %d/%m/%Y %H:%M')
+            elif isinstance(v, float):
+                row[name] = 'NaN' if v != v else repr(v)
+            else:
+                row[name] = str(v)
+        return row
+
 
 def load_prices(filename):
-    data = []
-    with open(filename) as csvfile:
-        reader = csv.DictReader(csvfile, delimiter=' ', quotechar='"', skipinitialspace=True)
-        for row in reader:
-            row['datetime'] = datetime.strptime(row['#DateTime'], '%a %d/%m/%Y %H:%M')
-            data.append(row)
-    return data
+    return load_price_columns(filename)
 
 def get_all_days(dat):
+    if isinstance(dat, PriceData):
+        return dat.all_days()
     days = set()
     for row in dat:
         days.add( row['datetime'].date() )
@@ -27,6 +229,8 @@ def get_random_day(dat, historic_days=100):
     return days[rand]
 
 def get_data_day(dat, day):
+    if isinstance(dat, PriceData):
+        return dat.between(day, day+timedelta(1))
     rows = []
     for row in dat:
         if row['datetime'].date() == day:
@@ -34,6 +238,8 @@ def get_data_day(dat, day):
     return rows
 
 def get_data_days(dat, day, delta):
+    if isinstance(dat, PriceData):
+        return dat.between(day, day+delta)
     rows = []
     for row in dat:
         mydate = row['datetime'].date()
@@ -42,6 +248,8 @@ def get_data_days(dat, day, delta):
     return rows
 
 def get_data_prevdays(dat, day, delta):
+    if isinstance(dat, PriceData):
+        return dat.between(day-delta, day)
     rows = []
     for row in dat:
         mydate = row['datetime'].date()
@@ -66,17 +274,18 @@ if __name__ == '__main__':
     day = get_random_day(dat, historic_days)
     print "Random day:",day
 
-    rows = get_data_day(dat, day)
-    features = [ [eval(v) for (k,v) in row.iteritems() if k in column_features] for row in rows]
-    prices = [ eval(row[column_predict]) for row in rows ]
+    from price_features import Features
+    feats = Features(dat, column_features)
+
+    features = feats.rows(day, day+timedelta(1))
+    prices = feats.target(column_predict, day, day+timedelta(1))
     #print "Data of today: ", features
-    print "Average real price today:", sum(prices)*1.0/len(prices)
+    print "Average real price today:", prices.mean()
 
-    rows = get_data_prevdays(dat, day, timedelta(historic_days))
-    features = [ [eval(v) for (k,v) in row.iteritems() if k in column_features] for row in rows]
-    prices = [ eval(row[column_predict]) for row in rows ]
-    print "Average real price previous days:", sum(prices)*1.0/len(prices)
+    features = feats.rows(day-timedelta(historic_days), day)
+    prices = feats.target(column_predict, day-timedelta(historic_days), day)
+    print "Average real price previous days:", prices.mean()
 
-    prices = [ eval(row[column_predict]) for row in rows if row['PeriodOfDay'] == '0' ]
-    print "Average real price previous days for 0th hour only:", sum(prices)*1.0/len(prices)
+    period = feats.target('PeriodOfDay', day-timedelta(historic_days), day)
+    print "Average real price previous days for 0th hour only:", prices[period == 0].mean()
 
@@ -1,6 +1,7 @@
 #!/usr/bin/env python
 
 from prices_data import *
+from price_features import Features
 import numpy as np
 from sklearn import linear_model
 from sklearn import svm
@@ -45,12 +46,11 @@ if __name__ == '__main__':
     preds = [] # [(model_name, predictions)]
 
     # method one: linear
-    rows_prev = get_data_prevdays(dat, day, timedelta(historic_days))
-    X_train = [ [eval(v) for (k,v) in row.iteritems() if k in column_features] for row in rows_prev]
-    y_train = [ eval(row[column_predict]) for row in rows_prev ]
-    rows_tod = get_data_days(dat, day, timedelta(7)) # for next week
-    X_test = [ [eval(v) for (k,v) in row.iteritems() if k in column_features] for row in rows_tod]
-    y_test = [ eval(row[column_predict]) for row in rows_tod ]
+    feats = Features(dat, column_features)
+    X_train = feats.rows(day - timedelta(historic_days), day)
+    y_train = feats.target(column_predict, day - timedelta(historic_days), day)
+    X_test = feats.rows(day, day + timedelta(7)) # for next week
+    y_test = feats.target(column_predict, day, day + timedelta(7))
 
 
     clf = linear_model.LinearRegression()
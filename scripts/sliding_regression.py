@@ -0,0 +1,190 @@
+#!/usr/bin/env python
+# linear (ridge) regression over a sliding window of days, for walk-forward
+# forecasting without refitting every day from scratch
+#
+# SlidingRegression keeps the sufficient statistics of the window: the sums
+# of w, w*x, w*y, w*x*x' and w*x*y over its rows (w the row weights), and of
+# every day in it. add() adds the statistics of a new day and subtracts
+# those of the day that leaves the window, fitting is solving one small
+# system in the number of features, whatever the number of rows
+#
+# the fit is that of sklearn's LinearRegression (alpha=0) or Ridge(alpha)
+# with an intercept: on the centred statistics, the intercept not
+# penalised, min-norm for singular windows (e.g. a feature that is
+# constant over the window)
+# decay < 1 weighs a day decay**(age-1), age 1 the newest day of the window
+# (sample_weight decay**(age-1) for sklearn)
+#
+# the statistics are accumulated around the mean of the first day added, and
+# recomputed from the per-day statistics every 'refresh' updates, so the
+# subtractions do not build up rounding errors
+
+import sys
+import collections
+import numpy as np
+
+
+def _stats(X, y, w, shift):
+    Xs = np.asarray(X, dtype=float) - shift[0]
+    ys = np.asarray(y, dtype=float) - shift[1]
+    wX = Xs * w[:,np.newaxis]
+    return [w.sum(), wX.sum(axis=0), (w*ys).sum(),
+            np.dot(wX.T, Xs), np.dot(wX.T, ys)]
+
+
+class SlidingRegression(object):
+
+    def __init__(self, window=None, alpha=0.0, decay=1.0, refresh=100):
+        # window: number of days (add() calls) to keep, None for all
+        self.window = window
+        self.alpha = alpha
+        self.decay = decay
+        self.refresh = refresh
+        self.reset()
+
+    def reset(self):
+        self.days = collections.deque() # per-day statistics, oldest first
+        self.total = None # weighted sum of self.days
+        self.shift = None
+        self.updates = 0
+        self.coef_ = None
+        self.intercept_ = None
+
+    def add(self, X, y, sample_weight=None):
+        # add the rows of one day, and drop the oldest day when the window
+        # is full; refits
+        # a day without rows still counts as a day of the window (and ages
+        # the others), so the window is in calendar days
+        day = None
+        if len(y) > 0:
+            w = np.ones(len(y)) if sample_weight is None else np.asarray(sample_weight, dtype=float)
+            if self.shift is None:
+                self.shift = (np.asarray(X, dtype=float).mean(axis=0), float(np.mean(y)))
+            day = _stats(X, y, w, self.shift)
+        self.days.append(day)
+        if self.total is not None:
+            self.total = [self.decay*t for t in self.total]
+        if day is not None:
+            if self.total is None:
+                self.total = [np.copy(s) for s in day]
+            else:
+                self.total = [t + s for (t, s) in zip(self.total, day)]
+        if self.window is not None and len(self.days) > self.window:
+            old = self.days.popleft()
+            if old is not None:
+                f = self.decay ** len(self.days)
+                self.total = [t - f*s for (t, s) in zip(self.total, old)]
+        self.updates += 1
+        if self.refresh and self.updates % self.refresh == 0:
+            self.recompute()
+        return self._solve()
+
+    def recompute(self):
+        # the window statistics from the per-day statistics
+        n = len(self.days)
+        days = [(i, day) for (i, day) in enumerate(self.days) if day is not None]
+        if not days:
+            self.total = None
+            return
+        self.total = [sum((self.decay ** (n-1-i)) * day[k] for (i, day) in days)
+                      for k in xrange(5)]
+
+    def fit(self, X, y, sample_weight=None):
+        # an ordinary fit on one block of rows (sklearn interface)
+        self.reset()
+        return self.add(X, y, sample_weight=sample_weight)
+
+    def _solve(self):
+        if self.total is None or all(day is None for day in self.days):
+            (self.coef_, self.intercept_) = (None, None) # no rows in the window
+            return self
+        (sw, swx, swy, sxx, sxy) = self.total
+        xm = swx / sw
+        ym = swy / sw
+        cxx = sxx - sw * np.outer(xm, xm)
+        cxy = sxy - sw * xm * ym
+        if self.alpha > 0:
+            coef = np.linalg.solve(cxx + self.alpha*np.eye(len(xm)), cxy)
+        else:
+            coef = np.linalg.lstsq(cxx, cxy, rcond=None)[0]
+        self.coef_ = coef
+        self.intercept_ = (ym + self.shift[1]) - np.dot(xm + self.shift[0], coef)
+        return self
+
+    def predict(self, X):
+        return np.dot(np.asarray(X, dtype=float), self.coef_) + self.intercept_
+
+
+def walk_forward(feats, column, first, last, model):
+    # one-day-ahead forecasts of 'column' for every day first <= day < last,
+    # with the SlidingRegression 'model' over the model.window calendar days
+    # before the day (all days of the data before it for window None)
+    # feats: price_features.Features
+    # yields (day, predictions, actuals)
+    from datetime import timedelta
+    model.reset()
+    if model.window is None:
+        start = min(feats.dat.all_days()[0], first)
+    else:
+        start = first - timedelta(model.window)
+    day = start
+    while day < first:
+        model.add(feats.rows(day, day + timedelta(1)),
+                  feats.target(column, day, day + timedelta(1)))
+        day += timedelta(1)
+    day = first
+    while day < last:
+        nextday = day + timedelta(1)
+        X = feats.rows(day, nextday)
+        y = feats.target(column, day, nextday)
+        if len(y) and model.coef_ is not None:
+            yield (day, model.predict(X), y)
+        model.add(X, y)
+        day = nextday
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2 or '-h' in sys.argv or '--help' in sys.argv:
+        print "%s prices.dat [window_days] [alpha] [decay]"%sys.argv[0]
+        print "Walk-forward one-day-ahead SMPEP2 forecasts over all days of the data, against a full refit every day"
+        sys.exit(0)
+
+    import time
+    from datetime import timedelta
+    from sklearn import linear_model
+    import prices_data
+    from price_features import Features
+
+    window = int(sys.argv[2]) if len(sys.argv) > 2 else 30
+    alpha = float(sys.argv[3]) if len(sys.argv) > 3 else 0.0
+    decay = float(sys.argv[4]) if len(sys.argv) > 4 else 1.0
+    column_features = [ 'HolidayFlag', 'DayOfWeek', 'PeriodOfDay', 'ForecastWindProduction', 'SystemLoadEA', 'SMPEA' ]
+    column_predict = 'SMPEP2'
+
+    dat = prices_data.load_prices(sys.argv[1])
+    feats = Features(dat, column_features)
+    days = prices_data.get_all_days(dat)
+    (first, last) = (days[0] + timedelta(window), days[-1] + timedelta(1))
+
+    time_start = time.time()
+    model = SlidingRegression(window=window, alpha=alpha, decay=decay)
+    incremental = list(walk_forward(feats, column_predict, first, last, model))
+    t_incr = time.time() - time_start
+
+    time_start = time.time()
+    maxdiff = 0.0
+    for (day, preds, actuals) in incremental:
+        prev = day - timedelta(window)
+        if alpha > 0:
+            clf = linear_model.Ridge(alpha=alpha)
+        else:
+            clf = linear_model.LinearRegression()
+        ages = np.repeat(np.arange(window, 0, -1), [len(feats.target(column_predict, prev + timedelta(i), prev + timedelta(i+1))) for i in xrange(window)])
+        clf.fit(feats.rows(prev, day), feats.target(column_predict, prev, day),
+                sample_weight=decay ** (ages - 1))
+        maxdiff = max(maxdiff, np.abs(clf.predict(feats.rows(day, day + timedelta(1))) - preds).max())
+    t_full = time.time() - time_start
+
+    errors = np.concatenate([preds - actuals for (day, preds, actuals) in incremental])
+    print "%i days, window %i days, alpha %g, decay %g: MSE %.3f, MAE %.3f"%(len(incremental), window, alpha, decay, np.mean(errors**2), np.mean(np.abs(errors)))
+    print "incremental %.2fs, full refits %.2fs, largest prediction difference %.2e"%(t_incr, t_full, maxdiff)
@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+# on-disk cache of MiniZinc runs, see mzn_run() in mzn-runcheck.py
+#
+# an entry is keyed by the sha1 of everything that determines the solver
+# output: the .mzn model, the dzn instance, the dzn forecast and the solver
+# name and options. Every entry is one json file in the cache directory with
+# the timing, the output lines, the time of every solution and whether the
+# solver was killed at the time limit.
+#
+# reading an entry touches its file, when the cache grows beyond max_bytes
+# the least recently used entries are removed
+
+import os
+import json
+import hashlib
+import threading
+
+CACHEEXT = '.json'
+
+
+class SolutionCache(object):
+
+    def __init__(self, cachedir, max_bytes=100*2**20):
+        self.cachedir = cachedir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock() # mzn_runall() solves in threads
+        if not os.path.isdir(cachedir):
+            os.makedirs(cachedir)
+        self.evict() # max_bytes may be lower than in an earlier run
+
+    def key(self, *parts):
+        h = hashlib.sha1()
+        for part in parts:
+            h.update(str(len(part)) + ':' + part) # unambiguous concatenation
+        return h.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cachedir, key + CACHEEXT)
+
+    def get(self, key):
+        # (timing, output lines, solution times, killed) or None
+        path = self._path(key)
+        try:
+            with open(path, 'r') as fin:
+                entry = json.load(fin)
+            hit = (entry['timing'], entry['out'], entry['times'], entry['killed'])
+            os.utime(path, None)
+        except (IOError, OSError, ValueError, KeyError): # KeyError: older entry
+            with self.lock:
+                self.misses += 1
+            return None
+        with self.lock:
+            self.hits += 1
+        return hit
+
+    def put(self, key, timing, out, times, killed):
+        path = self._path(key)
+        tmpfile = path + '.%i.%i.tmp'%(os.getpid(), threading.current_thread().ident)
+        with open(tmpfile, 'w') as fout:
+            json.dump({'timing': timing, 'out': out, 'times': times,
+                       'killed': killed}, fout)
+        os.rename(tmpfile, path)
+        self.evict()
+
+    def evict(self):
+        # remove least recently used entries until within max_bytes
+        entries = []
+        for fname in os.listdir(self.cachedir):
+            if not fname.endswith(CACHEEXT):
+                continue
+            try:
+                st = os.stat(os.path.join(self.cachedir, fname))
+            except OSError:
+                continue # removed by another thread or process
+            entries.append((st.st_mtime, st.st_size, fname))
+        total = sum(size for (mtime, size, fname) in entries)
+        for (mtime, size, fname) in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.cachedir, fname))
+            except OSError:
+                pass
+            total -= size
+
+    def __str__(self):
+        return "Solution cache '%s': %i hits, %i misses"%(self.cachedir, self.hits, self.misses)
@@ -0,0 +1,169 @@
+#!/usr/bin/env python
+# algorithm selection: predict the fastest (model, solver) per instance
+#
+# mzn-runcheck.py --runtime-log appends one line per solver run:
+#     instance; model; solver; runtime; complete; feature=value ...
+# a logged instance is the (absolute) instance file with the forecast it was
+# solved for, the same file with another forecast is another training row
+# (portfolio races log every solver, the losers as not complete)
+# the features are cheap to compute from the instance and the forecast,
+# see features(). A classifier is trained on the instances with at least one
+# complete run, labelled with their fastest complete (model, solver).
+#
+# evaluate() reports, with k-fold cross-validation over the logged
+# instances, the total runtime of the selector against every fixed choice
+# and against the virtual best (the fastest run of every instance)
+# the runtimes of losers of portfolio races are cut off at the winner, for
+# the evaluation log separate runs of every (model, solver) instead
+
+import sys
+import os.path
+import numpy as np
+
+import instance_data
+
+FEATURES = ['nr_tasks', 'nr_machines', 'tasks_per_machine',
+            'window_slack', 'window_ratio', 'utilisation',
+            'peak_utilisation', 'price_mean', 'price_cv']
+
+
+def features(data, prices):
+    # data: from instance_data.read_instance(), prices: one per time period
+    tasks = data['tasks']
+    cap = data['machines']['res'].astype(float)
+    (dur, use) = (tasks['dur'], tasks['usage'].astype(float))
+    nr_periods = (24*60) // data['time_step']
+    window = (tasks['late'] - tasks['earl']).astype(float)
+
+    work = (use * dur[:,np.newaxis]).sum(axis=0)
+    total = cap.sum(axis=0)
+    # resource use if every task ran over its whole window, per period
+    profile = np.zeros((nr_periods+1, use.shape[1]))
+    np.add.at(profile, tasks['earl'], use * (dur/window)[:,np.newaxis])
+    np.add.at(profile, tasks['late'], -use * (dur/window)[:,np.newaxis])
+    profile = np.cumsum(profile[:-1], axis=0)
+
+    prices = np.asarray(prices, dtype=float)
+    f = {'nr_tasks': len(dur),
+         'nr_machines': cap.shape[0],
+         'tasks_per_machine': float(len(dur)) / cap.shape[0],
+         'window_slack': (window - dur).mean(),
+         'window_ratio': (dur / window).mean(),
+         'utilisation': (work / (total*nr_periods)).max(),
+         'peak_utilisation': (profile / total).max(),
+         'price_mean': prices.mean(),
+         'price_cv': prices.std() / max(abs(prices.mean()), 1e-9)}
+    return f
+
+
+def instance_features(file_instance, prices):
+    return features(instance_data.read_instance(file_instance), prices)
+
+
+def log_run(logfile, file_instance, file_mzn, solver, timing, complete, feats):
+    with open(logfile, 'a') as fout:
+        print >> fout, "%s; %s; %s; %.4f; %s; %s"%(os.path.abspath(file_instance), file_mzn, solver, timing, complete, " ".join("%s=%r"%(k, feats[k]) for k in FEATURES))
+
+
+def read_log(logfile):
+    # {(instance, feature vector): (feature vector, {(model, solver): (runtime, complete)})}
+    # later runs of the same instance, forecast and algorithm replace earlier ones
+    runs = dict()
+    with open(logfile, 'r') as fin:
+        for line in fin:
+            fields = [x.strip() for x in line.split(';')]
+            if len(fields) != 6:
+                continue
+            (f, model, solver, timing, complete, feats) = fields
+            feats = dict(kv.split('=', 1) for kv in feats.split())
+            x = [float(feats[k]) for k in FEATURES]
+            key = (os.path.abspath(f), tuple(x))
+            if key not in runs:
+                runs[key] = (x, dict())
+            runs[key][1][(model, solver)] = (float(timing), complete == 'True')
+    return runs
+
+
+def fastest(algos):
+    # fastest complete (model, solver) of one instance, or None
+    done = [(t, algo) for (algo, (t, complete)) in algos.iteritems() if complete]
+    if not done:
+        return None
+    return min(done)[1]
+
+
+class Selector(object):
+
+    def __init__(self, runs):
+        # runs: from read_log()
+        from sklearn.ensemble import RandomForestClassifier # only needed here
+        labelled = [(x, fastest(algos)) for (x, algos) in runs.itervalues()
+                    if fastest(algos) is not None]
+        if not labelled:
+            raise Exception("No complete runs in the runtime log")
+        self.algos = sorted(set(algo for (x, algo) in labelled))
+        self.default = max(self.algos, key=lambda a: sum(1 for (x, b) in labelled if b == a))
+        self.clf = None
+        if len(self.algos) > 1:
+            self.clf = RandomForestClassifier(n_estimators=50, random_state=0)
+            self.clf.fit([x for (x, algo) in labelled],
+                         [self.algos.index(algo) for (x, algo) in labelled])
+
+    def select(self, feats):
+        # (model, solver) for a dict of features
+        if self.clf is None:
+            return self.default
+        x = [feats[k] for k in FEATURES]
+        return self.algos[int(self.clf.predict([x])[0])]
+
+
+def evaluate(runs, folds=5, seed=0):
+    # k-fold cross-validated total runtime of the selector, of every fixed
+    # choice and of the virtual best; a choice without a complete run on an
+    # instance is charged the slowest run logged for that instance
+    insts = sorted(f for f in runs if fastest(runs[f][1]) is not None)
+    algos = sorted(set(a for f in insts for a in runs[f][1]))
+
+    def cost(f, algo):
+        (t, complete) = runs[f][1].get(algo, (None, False))
+        if complete:
+            return t
+        return max(t for (t, c) in runs[f][1].itervalues())
+
+    rand = np.random.RandomState(seed)
+    order = rand.permutation(len(insts))
+    chosen = dict()
+    for k in xrange(folds):
+        test = set(insts[i] for i in order[k::folds])
+        train = dict((f, runs[f]) for f in runs if f not in test)
+        sel = Selector(train)
+        for f in test:
+            chosen[f] = sel.select(dict(zip(FEATURES, runs[f][0])))
+
+    report = {'instances': len(insts),
+              'selector': sum(cost(f, chosen[f]) for f in insts),
+              'virtual_best': sum(cost(f, fastest(runs[f][1])) for f in insts),
+              'fixed': dict((algo, sum(cost(f, algo) for f in insts)) for algo in algos)}
+    return report
+
+
+def print_report(report):
+    print "Instances with a complete run: %i"%report['instances']
+    for (algo, total) in sorted(report['fixed'].iteritems(), key=lambda x: x[1]):
+        print "fixed %-40s total runtime %10.2f"%("%s %s"%algo, total)
+    print "%-46s total runtime %10.2f"%("selector (cross-validated)", report['selector'])
+    print "%-46s total runtime %10.2f"%("virtual best", report['virtual_best'])
+    best_fixed = min(report['fixed'].values())
+    print "selector vs best fixed choice: %+.1f%%"%(100.0*(report['selector']-best_fixed)/best_fixed)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2 or '-h' in sys.argv or '--help' in sys.argv:
+        print "%s runtimes.log [folds]"%sys.argv[0]
+        print "Offline evaluation of the algorithm selector on a mzn-runcheck --runtime-log"
+        sys.exit(0)
+
+    folds = 5
+    if len(sys.argv) > 2:
+        folds = int(sys.argv[2])
+    print_report(evaluate(read_log(sys.argv[1]), folds=folds))
@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+# precomputed energy cost of every task at every possible start time
+#
+# for a price vector, starting task j at time s costs
+#     power_j * q/60 * sum(price[s:s+dur_j])
+# all these window sums follow from one cumulative sum over the prices,
+# so a (tasks x periods) table is built in one vectorized pass; entries
+# outside of [est_j, let_j-dur_j] are inf. With a (scenarios x periods)
+# price matrix the result is a (scenarios x tasks x periods) table.
+#
+# any cost lookup is then O(1): table[j, s] (or table[k, j, s])
+
+import numpy as np
+
+
+def start_costs(est, let, dur, power, prices, time_step):
+    prices = np.asarray(prices, dtype=float)
+    (est, let, dur) = (np.asarray(est), np.asarray(let), np.asarray(dur))
+    power = np.asarray(power, dtype=float)
+    nr_periods = prices.shape[-1]
+
+    cumprice = np.zeros(prices.shape[:-1] + (nr_periods+1,))
+    np.cumsum(prices, axis=-1, out=cumprice[...,1:])
+
+    starts = np.arange(nr_periods)
+    ends = np.minimum(starts[np.newaxis,:] + dur[:,np.newaxis], nr_periods)
+    window = cumprice[...,ends] - cumprice[...,starts][...,np.newaxis,:]
+    costs = window * (power * time_step / 60.0)[:,np.newaxis]
+
+    feasible = (starts[np.newaxis,:] >= est[:,np.newaxis]) & \
+               (starts[np.newaxis,:] + dur[:,np.newaxis] <= let[:,np.newaxis])
+    costs[...,~feasible] = np.inf
+    return costs
+
+def task_start_costs(tasks, prices, time_step):
+    # for checker TaskArrays (instance.day.taskdata)
+    return start_costs(tasks.est, tasks.let, tasks.duration, tasks.power, prices, time_step)
+
+def data_start_costs(data, prices):
+    # for the arrays of instance_data.read_instance() (offset 0)
+    tasks = data['tasks']
+    return start_costs(tasks['earl'], tasks['late'], tasks['dur'], tasks['power'], prices, data['time_step'])
+
+def instance_start_costs(instance, prices=None):
+    # for a checker Instance, by default with its forecast
+    if prices is None:
+        prices = instance.day.forecast
+    return task_start_costs(instance.day.taskdata, prices, instance.q)
+
+def cheapest_starts(costs):
+    # per task (per scenario) the start time with the lowest cost, and that cost
+    return (np.argmin(costs, axis=-1), np.min(costs, axis=-1))
+
+def schedule_cost(costs, starts):
+    # total task cost of the given start time of every task (per scenario)
+    starts = np.asarray(starts)
+    return costs[...,np.arange(len(starts)),starts].sum(axis=-1)
+
+
+if __name__ == '__main__':
+    import sys
+    import instance_data
+    import forecast2dzn as f2dzn
+
+    if len(sys.argv) < 3 or '-h' in sys.argv or '--help' in sys.argv:
+        print "%s instance.txt forecast.txt"%sys.argv[0]
+        sys.exit(0)
+
+    data = instance_data.read_instance(sys.argv[1])
+    prices = f2dzn.rescale(data['time_step'], f2dzn.read_forecast(sys.argv[2]))
+    costs = data_start_costs(data, prices)
+    (starts, best) = cheapest_starts(costs)
+    for j in range(len(starts)):
+        print "Task %i: cheapest start %i, cost %.4f"%(j, starts[j], best[j])
+    print "Sum of independent optima: %.4f"%best.sum()
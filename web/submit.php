@@ -52,8 +52,13 @@ function do_load($teamid, $loadname, $load_starts, $task_starts) {
                     print "Error, load '".$loadname."', day '".$startday."', f_inst '".$f."', taskid '".$taskid."': end after LET!";
                     return;
                 }
-                for ($i = $start; $i < $end; $i++)
-                    $cost += (1.0*$load_task['pow']*$actuals[$i]*$q/60.0);
+                if (array_key_exists('cost', $load_task)) {
+                    // precomputed cost per start time, from est onwards
+                    $cost += $load_task['cost'][$start-$load_task['est']];
+                } else {
+                    for ($i = $start; $i < $end; $i++)
+                        $cost += (1.0*$load_task['pow']*$actuals[$i]*$q/60.0);
+                }
             }
         }
         $costs[$startday] = $cost;